@@ -1,9 +1,10 @@
 import yfinance as yf
+import pandas as pd
 import os
 
 # S&P 500 index and sector ETFs
 sectors = {
-    "S&P500": "^GSPC",
+    "S&P 500": "^GSPC",
     "Technology": "XLK",
     "Financials": "XLF",
     "Healthcare": "XLV",
@@ -17,21 +18,80 @@ sectors = {
     "Infrastructure": "XLI",
 }
 
-# Set the date range for downloading data
+# Set the date range for downloading data (end_date=None means up to today)
 start_date = "2021-12-31"
 end_date = "2024-12-31"
 
-# Download data for each sector and S&P 500, then save as CSV
-for sector, ticker in sectors.items():
-    print(f"Downloading data for {sector} ({ticker})...")
-    data = yf.download(ticker, start=start_date, end=end_date)
-    
-    # Save as a CSV file in the current directory
-    csv_filename = f"{sector}_data.csv"
-    
-    # Show the file's save path
-    print(f"CSV file will be saved at: {os.path.abspath(csv_filename)}")
-    
-    # Save the CSV file
-    data.to_csv(csv_filename)
-    print(f"{sector} data has been saved as {csv_filename} ✅\n")
+# Local price store: one wide panel, columns = (Price field, Ticker)
+PANEL_PATH = "sector_prices.parquet"
+CSV_PATH = "S&P500_and_Sectors.csv"
+
+
+def load_panel(path: str = PANEL_PATH) -> pd.DataFrame:
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+    return pd.DataFrame()
+
+
+def download(tickers, start, end) -> pd.DataFrame:
+    """Download all tickers in one batched request (yfinance fetches them in parallel)."""
+    data = yf.download(list(tickers), start=start, end=end, group_by="column", auto_adjust=True, threads=True, progress=False)
+    return data.dropna(how="all")
+
+
+def update_panel(tickers, start: str, end: str = None, path: str = PANEL_PATH) -> pd.DataFrame:
+    """
+    Bring the local panel up to date:
+      - tickers not in the store yet are downloaded for the full range
+      - tickers already stored only fetch the bars after their own last stored date
+    Each ticker is downloaded once even if several sectors share it (e.g. XLI).
+    """
+    tickers = sorted(set(tickers))
+    panel = load_panel(path)
+    # Last stored bar per ticker; a ticker that lagged in an earlier run resumes from its own date
+    last_dates = panel["Close"].apply(pd.Series.last_valid_index).dropna() if not panel.empty else pd.Series(dtype=object)
+
+    parts = [panel] if not panel.empty else []
+    new_tickers = [t for t in tickers if t not in last_dates.index]
+    if new_tickers:
+        print(f"Downloading full history for {', '.join(new_tickers)}...")
+        parts.append(download(new_tickers, start, end))
+
+    # Tickers that share a resume date are still fetched in one batched request
+    resume = {}
+    for ticker in tickers:
+        if ticker in last_dates.index:
+            next_day = (pd.Timestamp(last_dates[ticker]) + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+            if end is None or next_day < end:
+                resume.setdefault(next_day, []).append(ticker)
+    for next_day, known_tickers in sorted(resume.items()):
+        print(f"Downloading bars since {next_day} for {', '.join(known_tickers)}...")
+        parts.append(download(known_tickers, next_day, end))
+
+    if all(part is panel or part.empty for part in parts):
+        print("Price store is already up to date ✅")
+        return panel
+
+    # Merge new rows / new tickers; later downloads win on overlapping dates
+    parts = [part for part in parts if not part.empty]
+    merged = pd.concat(parts, axis=0).groupby(level=0).last().sort_index()
+    merged = merged.reindex(columns=sorted(merged.columns))
+    merged.to_parquet(path)
+    print(f"Price panel saved at: {os.path.abspath(path)} ({merged.shape[0]} dates) ✅")
+    return merged
+
+
+def export_sector_csv(panel: pd.DataFrame, path: str = CSV_PATH, start: str = None, end: str = None) -> pd.DataFrame:
+    """Write the Close prices in the three-row-header layout that dataAgent_US_Market reads."""
+    close = panel["Close"].loc[start:end]
+    close = close[[ticker for ticker in sectors.values()]]
+    close.columns = pd.MultiIndex.from_tuples([("Close", name) for name in sectors], names=["Price", "Sectors"])
+    close.index.name = "Date"
+    close.to_csv(path)
+    print(f"Sector CSV saved at: {os.path.abspath(path)} ✅")
+    return close
+
+
+if __name__ == "__main__":
+    panel = update_panel(sectors.values(), start_date, end_date)
+    export_sector_csv(panel, start=start_date, end=end_date)
@@ -0,0 +1,198 @@
+import os
+import sys
+import json
+import hashlib
+from io import StringIO
+import numpy as np
+import pandas as pd
+
+from sector_analytics import BENCHMARK, TRADING_DAYS, daily_returns, load_close_panel
+
+# 共用工具放在專案根目錄的 common/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from common.prompt_encoder import encode_frame
+
+# Bump when optimize() changes so cached_optimize() does not serve stale results
+SOLVER_VERSION = 2
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), ".cache", "allocation")
+
+
+def annualized_moments(panel: pd.DataFrame):
+    """Annualized mean return vector and covariance matrix of daily returns."""
+    returns = daily_returns(panel.to_numpy(dtype=float))
+    return returns.mean(axis=0) * TRADING_DAYS, np.cov(returns, rowvar=False) * TRADING_DAYS
+
+
+def portfolio_stats(weights: np.ndarray, mu: np.ndarray, cov: np.ndarray, risk_free: float = 0.0):
+    """Return, volatility and Sharpe for a batch of portfolios (rows of weights) in matrix form."""
+    weights = np.atleast_2d(weights)
+    ret = weights @ mu
+    vol = np.sqrt(np.einsum("ij,jk,ik->i", weights, cov, weights))
+    return ret, vol, (ret - risk_free) / vol
+
+
+def sample_portfolios(n_assets: int, n_portfolios: int = 20000, seed: int = 0) -> np.ndarray:
+    """Long-only random portfolios drawn uniformly from the simplex (Dirichlet(1, ..., 1))."""
+    rng = np.random.default_rng(seed)
+    return rng.dirichlet(np.ones(n_assets), size=n_portfolios)
+
+
+def risk_parity_weights(cov: np.ndarray, tol: float = 1e-10, max_iter: int = 10000) -> np.ndarray:
+    """Equal risk contribution weights by multiplicative fixed-point iteration."""
+    n = len(cov)
+    weights = 1 / np.sqrt(np.diag(cov))
+    weights /= weights.sum()
+    for _ in range(max_iter):
+        marginal = cov @ weights
+        contribution = weights * marginal / (weights @ marginal)
+        if np.abs(contribution - 1 / n).max() < tol:
+            break
+        weights *= np.sqrt((1 / n) / contribution)
+        weights /= weights.sum()
+    return weights
+
+
+def project_to_simplex(v: np.ndarray) -> np.ndarray:
+    """Euclidean projection onto {w >= 0, sum(w) = 1} (sort-based, O(n log n))."""
+    u = np.sort(v)[::-1]
+    cumsum = np.cumsum(u) - 1
+    rho = np.nonzero(u > cumsum / np.arange(1, len(v) + 1))[0][-1]
+    return np.maximum(v - cumsum[rho] / (rho + 1), 0)
+
+
+def _projected_gradient(grad, project, x0: np.ndarray, step: float, tol: float, max_iter: int) -> np.ndarray:
+    """Accelerated projected gradient (FISTA) for a convex quadratic over a convex set."""
+    x = y = x0
+    t = 1.0
+    for _ in range(max_iter):
+        x_next = project(y - step * grad(y))
+        if np.abs(x_next - x).max() < tol:
+            return x_next
+        t_next = (1 + np.sqrt(1 + 4 * t * t)) / 2
+        y = x_next + (t - 1) / t_next * (x_next - x)
+        x, t = x_next, t_next
+    return x
+
+
+def _polish(cov: np.ndarray, rhs: np.ndarray, support: np.ndarray):
+    """Solve cov[S, S] x_S = rhs[S] exactly on the support found by the iterative solver."""
+    x = np.zeros(len(rhs))
+    try:
+        x[support] = np.linalg.solve(cov[np.ix_(support, support)], rhs[support])
+    except np.linalg.LinAlgError:
+        return None
+    return x
+
+
+def min_variance_weights(cov: np.ndarray, tol: float = 1e-12, max_iter: int = 100000) -> np.ndarray:
+    """Long-only minimum variance: min w'Σw subject to w >= 0, sum(w) = 1."""
+    n = len(cov)
+    step = 1 / (2 * np.linalg.eigvalsh(cov)[-1])
+    weights = _projected_gradient(lambda w: 2 * cov @ w, project_to_simplex, np.full(n, 1 / n), step, tol, max_iter)
+
+    # On the active set the KKT conditions are linear: w_S ∝ Σ_SS^-1 1; keep it if it stays optimal
+    exact = _polish(cov, np.ones(n), weights > 1e-9)
+    if exact is not None and exact.sum() > 0:
+        exact /= exact.sum()
+        marginal = cov @ exact
+        if exact.min() >= 0 and marginal.min() >= (exact @ marginal) * (1 - 1e-9):
+            return exact
+    return weights
+
+
+def max_sharpe_weights(mu: np.ndarray, cov: np.ndarray, risk_free: float = 0.0,
+                       tol: float = 1e-12, max_iter: int = 100000):
+    """
+    Long-only maximum Sharpe (tangency) portfolio. Sharpe is scale invariant, so with excess returns e
+    the problem is the convex QP min ½z'Σz - e'z subject to z >= 0, and w = z / sum(z).
+    Returns None when no long-only portfolio has a positive excess return.
+    """
+    excess = mu - risk_free
+    if excess.max() <= 0:
+        return None
+    step = 1 / np.linalg.eigvalsh(cov)[-1]
+    z = _projected_gradient(lambda z: cov @ z - excess, lambda z: np.maximum(z, 0), np.zeros(len(mu)),
+                            step, tol, max_iter)
+
+    # Exact KKT solution on the active set: z_S = Σ_SS^-1 e_S, gradient >= 0 off the support
+    exact = _polish(cov, excess, z > 1e-9 * z.max())
+    if exact is not None and exact.min() >= 0 and (cov @ exact - excess).min() >= -1e-9 * excess.max():
+        z = exact
+    return z / z.sum()
+
+
+def efficient_frontier(ret: np.ndarray, vol: np.ndarray, points: int = 25) -> pd.DataFrame:
+    """Upper envelope of the sampled cloud: the lowest volatility portfolio in each return bucket."""
+    edges = np.linspace(ret.min(), ret.max(), points + 1)
+    bucket = np.clip(np.digitize(ret, edges) - 1, 0, points - 1)
+    order = np.lexsort((vol, bucket))
+    first = order[np.r_[True, bucket[order][1:] != bucket[order][:-1]]]
+    frontier = pd.DataFrame({"return": ret[first], "volatility": vol[first]}).sort_values("volatility")
+    # Keep only the efficient half (return rising with volatility)
+    return frontier[frontier["return"] >= frontier["return"].cummax()].reset_index(drop=True)
+
+
+def optimize(panel: pd.DataFrame, risk_free: float = 0.0, n_portfolios: int = 20000, seed: int = 0) -> dict:
+    """
+    Long-only allocation over the sector ETFs (benchmark excluded):
+      - min_variance / max_sharpe: exact long-only optima (projected gradient, refined on the active set);
+        max_sharpe falls back to the best sampled portfolio when every excess return is negative
+      - risk_parity: equal risk contribution weights
+      - frontier: efficient frontier traced from n_portfolios random portfolios, evaluated in one batch
+    """
+    assets = panel.drop(columns=[BENCHMARK], errors="ignore")
+    names = list(assets.columns)
+    mu, cov = annualized_moments(assets)
+
+    samples = sample_portfolios(len(names), n_portfolios, seed)
+    # Include the single-asset corners so extreme portfolios are reachable
+    samples = np.vstack([samples, np.eye(len(names))])
+    ret, vol, sharpe = portfolio_stats(samples, mu, cov, risk_free)
+
+    tangency = max_sharpe_weights(mu, cov, risk_free)
+    strategies = {
+        "min_variance": min_variance_weights(cov),
+        "max_sharpe": tangency if tangency is not None else samples[np.argmax(sharpe)],
+        "risk_parity": risk_parity_weights(cov),
+        "equal_weight": np.full(len(names), 1 / len(names)),
+    }
+    weights = pd.DataFrame(strategies, index=names)
+    s_ret, s_vol, s_sharpe = portfolio_stats(weights.T.to_numpy(), mu, cov, risk_free)
+    stats = pd.DataFrame({"return": s_ret, "volatility": s_vol, "sharpe": s_sharpe}, index=list(strategies))
+
+    return {"weights": weights, "stats": stats, "frontier": efficient_frontier(ret, vol)}
+
+
+def cached_optimize(panel: pd.DataFrame, start: str = None, end: str = None, risk_free: float = 0.0,
+                    n_portfolios: int = 20000, seed: int = 0, cache_dir: str = CACHE_DIR) -> dict:
+    """optimize() on panel.loc[start:end], cached on disk per date range and settings."""
+    window = panel.loc[start:end]
+    key_text = json.dumps([SOLVER_VERSION, str(window.index[0].date()), str(window.index[-1].date()), list(window.columns),
+                           risk_free, n_portfolios, seed, float(window.to_numpy().sum())])
+    key = hashlib.sha256(key_text.encode("utf-8")).hexdigest()
+    path = os.path.join(cache_dir, f"{key}.json")
+
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return {name: pd.read_json(StringIO(value), orient="split") for name, value in data.items()}
+
+    result = optimize(window, risk_free, n_portfolios, seed)
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({name: df.to_json(orient="split") for name, df in result.items()}, f)
+    return result
+
+
+def format_for_prompt(result: dict, precision: int = 3) -> str:
+    weights = result["weights"].reset_index(names="sector")
+    stats = result["stats"].reset_index(names="strategy")
+    return (
+        f"Long-only sector ETF allocations (weights):\n{encode_frame(weights, precision)}\n\n"
+        f"Allocation statistics (annualized):\n{encode_frame(stats, precision)}\n\n"
+        f"Efficient frontier (sampled):\n{encode_frame(result['frontier'], precision)}"
+    )
+
+
+if __name__ == "__main__":
+    print(format_for_prompt(cached_optimize(load_close_panel())))
@@ -1,4 +1,5 @@
 import os
+import sys
 import asyncio
 import pandas as pd
 from dotenv import load_dotenv
@@ -12,32 +13,82 @@ from autogen_agentchat.messages import TextMessage
 from autogen_ext.models.openai import OpenAIChatCompletionClient
 from autogen_ext.agents.web_surfer import MultimodalWebSurfer
 
+# 共用工具放在專案根目錄的 common/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from common.digest import digest_chunk
+from common.prompt_encoder import encode_frame, token_savings
+from common.search_cache import SearchCache, run_web_research
+from common.conversation_log import ConversationLogWriter, compact_log
+from common.budget import BudgetedRun, budget_from_env, build_termination
+from common.chunk_cache import ChunkCache
+from common.telemetry import Telemetry
+from common.replay_client import wrap_from_env
+from sector_analytics import analyze_panel, format_for_prompt, load_close_panel
+import allocation
+
 
 load_dotenv()
 
+# 修改 process_chunk 的 prompt 時請一併更新版本，舊的批次快取就會失效
+PROMPT_VERSION = "v3"
+
+# 所有批次共用的外部搜尋主題
+RESEARCH_QUERY = (
+    "Search for the major economic events, government policies and global financial trends that influenced "
+    "the U.S. stock market in each year from 2021 to 2024, such as interest rate changes, fiscal stimulus, "
+    "supply chain disruptions and major corporate earnings reports. Summarize the key points with sources."
+)
+
 # HW1 指令修改
-async def process_chunk(chunk, start_idx, total_records, model_client, termination_condition):
+async def process_chunk(chunk, start_idx, total_records, model_client, termination_condition, include_raw=False, research_notes=None, log_writer=None, headless=False, timeout_seconds=None, telemetry=None, analytics=None):
     """
     Process a single batch of data:
-      - Convert the batch data into a dictionary format.
+      - Compress the batch into a statistical digest (distributions, monthly counts, trends, outliers);
+        the raw records are appended only when include_raw=True.
+      - Include the precomputed full-panel sector analytics (returns, volatility, Sharpe, drawdowns,
+        correlations, relative strength, and min-variance / max-Sharpe / risk-parity allocations with the
+        efficient frontier) when given, so the agents cite exact numbers instead of estimating them.
       - Generate a prompt for agents to analyze the given data and provide investment insights.
       - Use the MultimodalWebSurfer agent to search external sources for relevant market news,
         including major economic events, government policies, and financial trends, and integrate the findings into the analysis.
-      - Collect and return all agent responses.
+        When research_notes (findings gathered once before the fan-out) is given, it is injected into the prompt
+        and the per-batch web surfer is skipped.
+      - Run the team within the given budget (termination_condition plus a wall-clock limit of
+        timeout_seconds); headless=True leaves out the UserProxyAgent so unattended runs never wait for input.
+      - Stream every agent response and the final StopReason record to log_writer instead of keeping the
+        transcript in memory, and return a per-batch summary (last reply, token totals, stop reason, timed_out).
     """
 
 
-    # 將資料轉成 dict 格式
-    chunk_data = chunk.to_dict(orient='records')
+    # 預設只提供統計摘要，原始資料需明確要求才放入 prompt
+    chunk_data = digest_chunk(chunk)
+    if include_raw:
+        raw_data = encode_frame(chunk)
+        savings = token_savings(chunk, raw_data)
+        print(f"[batch {start_idx}] raw data tokens: {savings['encoded_tokens']} (records 格式 {savings['baseline_tokens']}，節省 {savings['saved_ratio']:.0%})")
+        chunk_data += f"\n\nRaw records (TSV):\n{raw_data}"
+    if analytics:
+        chunk_data += f"\n\nPrecomputed sector analytics for the full 2022-2024 panel (use these exact figures):\n{analytics}"
+
+    if research_notes:
+        research_step = (
+            "  2. The following research on major economic events, government policies, and global financial trends "
+            f"was gathered in advance; integrate these findings into your analysis:\n{research_notes}\n"
+        )
+    else:
+        research_step = (
+            "  2. Use MultimodalWebSurfer to search external sources for major economic events, government policies, and global financial trends that influenced the market each year, "
+            "     such as interest rate changes, fiscal stimulus, supply chain disruptions, or major corporate earnings reports, and integrate these findings into your analysis.\n"
+        )
     prompt = (
     f"Currently processing records {start_idx} to {start_idx + len(chunk) - 1} (out of {total_records}).\n"
-    f"Here is the data for this batch:\n{chunk_data}\n\n"
+    f"Here is the statistical digest for this batch:\n{chunk_data}\n\n"
     "Please analyze the given S&P 500 data (including S&P 500 and its 11 industry sectors from 2021 to 2024) and provide a comprehensive investment analysis. "
     "Specifically, focus on the following aspects:\n"
     "  1. Identify key factors driving the S&P 500's growth or decline over the given period, including macroeconomic trends, monetary policy, inflation, and geopolitical events.\n"
-    "  2. Use MultimodalWebSurfer to search external sources for major economic events, government policies, and global financial trends that influenced the market each year, "
-    "     such as interest rate changes, fiscal stimulus, supply chain disruptions, or major corporate earnings reports, and integrate these findings into your analysis.\n"
-    "  3. Provide an asset allocation strategy based on the historical performance and risk profile of different industry sectors. "
+    f"{research_step}"
+    "  3. Provide an asset allocation strategy based on the historical performance and risk profile of different industry sectors, "
+    "     citing the precomputed optimizer allocations when they are provided. "
     "     Consider factors such as sector rotation, market cycles, and risk-adjusted returns.\n"
     "  4. Assess potential risks associated with investing in specific industries or assets, explaining why these risks exist. "
     "     Consider economic downturns, regulatory changes, global crises, or sector-specific vulnerabilities.\n"
@@ -50,20 +101,25 @@ async def process_chunk(chunk, start_idx, total_records, model_client, terminati
     
     # 為每個批次建立新的 agent 與 team 實例
     local_data_agent = AssistantAgent("data_agent", model_client)
-    local_web_surfer = MultimodalWebSurfer("web_surfer", model_client)
     local_assistant = AssistantAgent("assistant", model_client)
-    local_user_proxy = UserProxyAgent("user_proxy")
-    local_team = RoundRobinGroupChat(
-        [local_data_agent, local_web_surfer, local_assistant, local_user_proxy],
-        termination_condition=termination_condition
-    )
+    participants = [local_data_agent, local_assistant]
+    if not research_notes:
+        participants.insert(1, MultimodalWebSurfer("web_surfer", model_client))
+    if not headless:
+        # 無人值守 (headless) 時不加入會等待輸入的 UserProxyAgent
+        participants.append(UserProxyAgent("user_proxy"))
+    local_team = RoundRobinGroupChat(participants, termination_condition=termination_condition)
     
-    messages = []
-    async for event in local_team.run_stream(task=prompt):
+    run = BudgetedRun(local_team, prompt, timeout_seconds=timeout_seconds)
+    # 有傳入 telemetry 時記錄每則訊息的耗時與 token
+    stream = run if telemetry is None else telemetry.track(run, start_idx)
+    # 完整對話只寫進 log_writer，記憶體中只保留摘要需要的最後回覆與 token 累計
+    last_reply = None
+    message_count = 0
+    prompt_tokens = completion_tokens = 0
+    async for event in stream:
         if isinstance(event, TextMessage):
-            # 印出目前哪個 agent 正在運作，方便追蹤
-            print(f"[{event.source}] => {event.content}\n")
-            messages.append({
+            message = {
                 "batch_start": start_idx,
                 "batch_end": start_idx + len(chunk) - 1,
                 "source": event.source,
@@ -71,8 +127,47 @@ async def process_chunk(chunk, start_idx, total_records, model_client, terminati
                 "type": event.type,
                 "prompt_tokens": event.models_usage.prompt_tokens if event.models_usage else None,
                 "completion_tokens": event.models_usage.completion_tokens if event.models_usage else None
-            })
-    return messages
+            }
+            if log_writer is not None:
+                # 每則訊息一產生就寫入紀錄檔
+                await log_writer.put(message)
+            else:
+                # 印出目前哪個 agent 正在運作，方便追蹤
+                print(f"[{event.source}] => {event.content}\n")
+            message_count += 1
+            prompt_tokens += message["prompt_tokens"] or 0
+            completion_tokens += message["completion_tokens"] or 0
+            if event.source != "user":
+                last_reply = message
+
+    # 記錄這個批次的終止原因 (終止條件、token/輪數上限或逾時)
+    stop_message = {
+        "batch_start": start_idx,
+        "batch_end": start_idx + len(chunk) - 1,
+        "source": "system",
+        "content": run.stop_reason,
+        "type": "StopReason",
+        "prompt_tokens": None,
+        "completion_tokens": None,
+        "timed_out": run.timed_out
+    }
+    print(f"[batch {start_idx}] stopped: {run.stop_reason} ({run.elapsed:.1f}s)")
+    if log_writer is not None:
+        await log_writer.put(stop_message)
+
+    # 回傳的摘要與 synthesize_analysis 使用的訊息格式相同 (batch_start / batch_end / content)
+    return {
+        "batch_start": start_idx,
+        "batch_end": start_idx + len(chunk) - 1,
+        "source": last_reply["source"] if last_reply else "system",
+        "content": last_reply["content"] if last_reply else "",
+        "type": "ChunkSummary",
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "messages": message_count,
+        "stop_reason": run.stop_reason,
+        "timed_out": run.timed_out
+    }
 
 async def main():
     gemini_api_key = os.environ.get("GEMINI_API_KEY")
@@ -81,41 +176,80 @@ async def main():
         return
 
     # 初始化模型用戶端 (此處示範使用 gemini-2.0-flash)
-    model_client = OpenAIChatCompletionClient(
+    # 設定 MODEL_REPLAY_MODE 時改用錄製 / 重播用戶端，可離線重跑
+    model_client = wrap_from_env(OpenAIChatCompletionClient(
         model="gemini-2.0-flash",
         api_key=gemini_api_key,
-    )
+    ))
     
-    termination_condition = TextMentionTermination("exit")
+    # 預算設定 (輪數、token、每批次時間上限、headless) 由 .env 控制
+    budget = budget_from_env()
     
     # HW1 CSV 檔案修改
     # 使用 pandas 以 chunksize 方式讀取 CSV 檔案
     csv_file_path = "S&P500_and_Sectors.csv"
     chunk_size = 10000
-    chunks = list(pd.read_csv(csv_file_path, chunksize=chunk_size))
+    # CSV 前三列為 yfinance 的多層標題，取第二列 (產業名稱) 作為欄位名稱
+    chunks = list(pd.read_csv(csv_file_path, chunksize=chunk_size, header=1, skiprows=[2]))
     total_records = sum(chunk.shape[0] for chunk in chunks)
+
+    # 以 NumPy 在完整資料上一次算好報酬、波動、Sharpe、回撤、相關係數與相對強弱，提供給所有批次
+    panel = load_close_panel(csv_file_path)
+    analytics = format_for_prompt(analyze_panel(panel))
+    # 最小變異、最大 Sharpe、風險平價配置與效率前緣 (依日期區間快取)
+    analytics += "\n\n" + allocation.format_for_prompt(allocation.cached_optimize(panel))
+
+    # 分派批次前先搜尋一次，結果存在磁碟快取，所有批次與之後的執行共用
+    research_notes = await run_web_research(RESEARCH_QUERY, model_client, SearchCache())
     
-    # 利用 map 與 asyncio.gather 同時處理所有批次（避免使用傳統 for 迴圈）
-    tasks = list(map(
-        lambda idx_chunk: process_chunk(
-            idx_chunk[1],
-            idx_chunk[0] * chunk_size,
-            total_records,
-            model_client,
-            termination_condition
-        ),
-        enumerate(chunks)
-    ))
-    
-    results = await asyncio.gather(*tasks)
-    # 將所有批次的訊息平坦化成一個清單
-    all_messages = [msg for batch in results for msg in batch]
-    
-    # 將對話紀錄整理成 DataFrame 並存成 CSV
-    df_log = pd.DataFrame(all_messages)
+    # 批次結果依內容雜湊快取，重跑時只有新增或變動的批次會呼叫代理人
+    chunk_cache = ChunkCache(PROMPT_VERSION, context=[research_notes, analytics])
+    telemetry = Telemetry()
+
+    # 對話紀錄邊產生邊寫入 JSONL，單一批次失敗也不會遺失其他批次的訊息
+    log_file = "all_conversation_log.jsonl"
+    async with ConversationLogWriter(log_file) as log_writer:
+        # 利用 map 與 asyncio.gather 同時處理所有批次（避免使用傳統 for 迴圈）
+        tasks = list(map(
+            lambda idx_chunk: chunk_cache.get_or_run(
+                idx_chunk[1],
+                idx_chunk[0] * chunk_size,
+                lambda: process_chunk(
+                    idx_chunk[1],
+                    idx_chunk[0] * chunk_size,
+                    total_records,
+                    model_client,
+                    # 終止條件有狀態，每個批次各自建立
+                    build_termination(budget["max_turns"], budget["max_tokens"]),
+                    research_notes=research_notes,
+                    log_writer=log_writer,
+                    headless=budget["headless"],
+                    timeout_seconds=budget["timeout_seconds"],
+                    telemetry=telemetry,
+                    analytics=analytics
+                ),
+                log_writer=log_writer,
+                # 逾時中斷的批次結果不完整，不寫入快取
+                cache_if=lambda summary: not summary["timed_out"]
+            ),
+            enumerate(chunks)
+        ))
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for idx, result in enumerate(results):
+            if isinstance(result, Exception):
+                print(f"第 {idx * chunk_size} 筆開始的批次處理失敗：{result}")
+
+    # 將本次執行的紀錄整理成最終 CSV
     output_file = "all_conversation_log.csv"
-    df_log.to_csv(output_file, index=False, encoding="utf-8-sig")
-    print(f"已將所有對話紀錄輸出為 {output_file}")
+    compact_log(log_file, output_file, run_id=log_writer.run_id)
+    print(f"批次快取命中 {chunk_cache.hits} 個，重新分析 {chunk_cache.misses} 個")
+
+    # 匯出各代理人的耗時與 token (trace 可用 chrome://tracing 或 Perfetto 開啟)
+    telemetry.to_chrome_trace("telemetry_trace.json")
+    telemetry.to_summary_csv("telemetry_summary.csv")
+    print(telemetry.kind_totals())
+    print(f"已將 {log_writer.count} 則對話紀錄輸出為 {output_file}")
 
 def new_func():
     return 1000
@@ -0,0 +1,147 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# 共用工具放在專案根目錄的 common/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from common.prompt_encoder import encode_frame
+
+TRADING_DAYS = 252
+BENCHMARK = "S&P 500"
+
+
+def load_close_panel(csv_path: str = "S&P500_and_Sectors.csv") -> pd.DataFrame:
+    """Read the sector CSV (three-row yfinance header) into a (dates x sectors) Close panel."""
+    panel = pd.read_csv(csv_path, header=1, skiprows=[2], index_col=0)
+    panel.index = pd.to_datetime(panel.index, format="mixed")
+    panel.index.name = "Date"
+    # Sectors that track the same ETF (Industrials / Infrastructure) are kept once
+    return panel.T.drop_duplicates().T.astype(float).sort_index()
+
+
+def daily_returns(prices: np.ndarray) -> np.ndarray:
+    return prices[1:] / prices[:-1] - 1
+
+
+def rolling_returns(prices: np.ndarray, window: int) -> np.ndarray:
+    """(T - window) x N matrix of trailing window returns."""
+    return prices[window:] / prices[:-window] - 1
+
+
+def rolling_volatility(returns: np.ndarray, window: int) -> np.ndarray:
+    """Annualized rolling standard deviation using cumulative sums, (T - window + 1) x N."""
+    zero = np.zeros((1, returns.shape[1]))
+    s1 = np.vstack([zero, np.cumsum(returns, axis=0)])
+    s2 = np.vstack([zero, np.cumsum(returns ** 2, axis=0)])
+    sum1 = s1[window:] - s1[:-window]
+    sum2 = s2[window:] - s2[:-window]
+    var = (sum2 - sum1 ** 2 / window) / (window - 1)
+    return np.sqrt(np.clip(var, 0, None) * TRADING_DAYS)
+
+
+def drawdowns(prices: np.ndarray) -> np.ndarray:
+    """Drawdown from the running peak for every date and ticker."""
+    return prices / np.maximum.accumulate(prices, axis=0) - 1
+
+
+def sharpe_ratios(returns: np.ndarray, risk_free: float = 0.0) -> np.ndarray:
+    excess = returns - risk_free / TRADING_DAYS
+    std = returns.std(axis=0, ddof=1)
+    return np.divide(excess.mean(axis=0), std, out=np.zeros_like(std), where=std > 0) * np.sqrt(TRADING_DAYS)
+
+
+def rolling_correlation(returns: np.ndarray, window: int) -> np.ndarray:
+    """
+    Rolling correlation matrices, shape (T - window + 1, N, N).
+    Built from cumulative sums of returns and of their outer products, so every window is O(N^2).
+    """
+    T, N = returns.shape
+    zero1 = np.zeros((1, N))
+    zero2 = np.zeros((1, N, N))
+    s1 = np.vstack([zero1, np.cumsum(returns, axis=0)])
+    s_xy = np.concatenate([zero2, np.cumsum(returns[:, :, None] * returns[:, None, :], axis=0)])
+    sum1 = s1[window:] - s1[:-window]
+    sum_xy = s_xy[window:] - s_xy[:-window]
+    cov = (sum_xy - sum1[:, :, None] * sum1[:, None, :] / window) / (window - 1)
+    std = np.sqrt(np.clip(np.diagonal(cov, axis1=1, axis2=2), 0, None))
+    denom = std[:, :, None] * std[:, None, :]
+    return np.divide(cov, denom, out=np.zeros_like(cov), where=denom > 0)
+
+
+def analyze_panel(panel: pd.DataFrame, windows=(21, 63, 252), corr_window: int = 63, risk_free: float = 0.0) -> dict:
+    """
+    Compute the sector analytics over a (dates x tickers) Close panel in one pass of array operations:
+      - summary: total / annualized return, volatility, Sharpe, max drawdown, current drawdown,
+        trailing returns for each window and the relative-strength rank against the benchmark
+      - yearly: calendar-year returns per sector
+      - correlation: the latest rolling correlation matrix (corr_window days)
+      - rolling_correlation: average pairwise correlation over time
+    """
+    names = list(panel.columns)
+    prices = panel.to_numpy(dtype=float)
+    returns = daily_returns(prices)
+    years = len(returns) / TRADING_DAYS
+
+    total_return = prices[-1] / prices[0] - 1
+    dd = drawdowns(prices)
+    summary = pd.DataFrame({
+        "total_return": total_return,
+        "annual_return": (1 + total_return) ** (1 / years) - 1,
+        "annual_volatility": returns.std(axis=0, ddof=1) * np.sqrt(TRADING_DAYS),
+        "sharpe": sharpe_ratios(returns, risk_free),
+        "max_drawdown": dd.min(axis=0),
+        "current_drawdown": dd[-1],
+    }, index=names)
+
+    for window in windows:
+        if len(prices) > window:
+            summary[f"return_{window}d"] = rolling_returns(prices, window)[-1]
+            summary[f"volatility_{window}d"] = rolling_volatility(returns, window)[-1]
+
+    # Relative strength: trailing return minus the benchmark's, ranked (1 = strongest)
+    if BENCHMARK in names:
+        bench = names.index(BENCHMARK)
+        valid = [w for w in windows if len(prices) > w]
+        strength_window = max(valid) if valid else len(prices) - 1
+        trailing = rolling_returns(prices, strength_window)[-1]
+        summary["relative_strength"] = trailing - trailing[bench]
+        summary["rs_rank"] = summary["relative_strength"].rank(ascending=False).astype(int)
+
+    # Calendar-year returns from the last close of each year
+    year_end = panel.groupby(panel.index.year).tail(1)
+    yearly = year_end.pct_change()
+    yearly.iloc[0] = year_end.iloc[0] / panel.iloc[0] - 1
+    yearly.index = year_end.index.year
+
+    corr = rolling_correlation(returns, corr_window)
+    mask = ~np.eye(len(names), dtype=bool)
+    avg_corr = pd.Series(corr[:, mask].mean(axis=1), index=panel.index[corr_window:], name="avg_pairwise_corr")
+
+    return {
+        "summary": summary,
+        "yearly": yearly,
+        "correlation": pd.DataFrame(corr[-1], index=names, columns=names),
+        "rolling_correlation": avg_corr,
+    }
+
+
+def format_for_prompt(results: dict, precision: int = 3) -> str:
+    """Compact text block (TSV tables) of the analytics for the agent prompt."""
+    summary = results["summary"].sort_values("sharpe", ascending=False).reset_index(names="sector")
+    yearly = results["yearly"].T.reset_index(names="sector")
+    yearly.columns = [str(c) for c in yearly.columns]
+    correlation = results["correlation"].reset_index(names="sector")
+    avg_corr = results["rolling_correlation"].resample("QE").last().reset_index()
+    return (
+        "Sector summary (returns/volatility annualized, sorted by Sharpe):\n"
+        f"{encode_frame(summary, precision)}\n\n"
+        f"Calendar-year returns:\n{encode_frame(yearly, precision)}\n\n"
+        f"Latest rolling correlation matrix:\n{encode_frame(correlation, 2)}\n\n"
+        f"Average pairwise correlation (quarter end):\n{encode_frame(avg_corr, precision)}"
+    )
+
+
+if __name__ == "__main__":
+    results = analyze_panel(load_close_panel())
+    print(format_for_prompt(results))
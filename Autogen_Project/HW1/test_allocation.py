@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+import allocation
+
+
+def random_cov(n: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    factors = rng.normal(size=(n, n))
+    return (factors @ factors.T / n + np.diag(rng.uniform(0.5, 1.5, n))) * 0.04
+
+
+def test_min_variance_matches_closed_form_when_unconstrained_optimum_is_long_only():
+    # Diagonal-dominant covariance: w = Σ^-1 1 / 1'Σ^-1 1 has all weights positive
+    cov = np.diag([0.04, 0.09, 0.16, 0.25]) + 0.005
+    inv_ones = np.linalg.solve(cov, np.ones(4))
+    expected = inv_ones / inv_ones.sum()
+    assert expected.min() > 0
+
+    np.testing.assert_allclose(allocation.min_variance_weights(cov), expected, atol=1e-10)
+
+
+def test_max_sharpe_matches_closed_form_when_unconstrained_optimum_is_long_only():
+    cov = np.diag([0.04, 0.09, 0.16, 0.25]) + 0.005
+    mu = np.array([0.08, 0.10, 0.12, 0.15])
+    risk_free = 0.02
+    inv_excess = np.linalg.solve(cov, mu - risk_free)
+    expected = inv_excess / inv_excess.sum()
+    assert expected.min() > 0
+
+    np.testing.assert_allclose(allocation.max_sharpe_weights(mu, cov, risk_free), expected, atol=1e-10)
+
+
+def test_long_only_constraint_binds_for_negative_excess_return():
+    # Uncorrelated assets: tangency weights ∝ e_i / σ_i², the negative excess return asset gets 0
+    variances = np.array([0.04, 0.09, 0.16])
+    mu = np.array([0.10, 0.12, -0.05])
+    expected = np.array([0.10 / 0.04, 0.12 / 0.09, 0.0])
+    expected /= expected.sum()
+
+    np.testing.assert_allclose(allocation.max_sharpe_weights(mu, np.diag(variances)), expected, atol=1e-10)
+
+
+def test_max_sharpe_is_none_without_positive_excess_return():
+    assert allocation.max_sharpe_weights(np.array([-0.01, -0.02]), np.eye(2) * 0.04) is None
+
+
+def test_exact_solutions_beat_every_sampled_portfolio():
+    n = 8
+    cov = random_cov(n, seed=1)
+    mu = np.random.default_rng(2).normal(0.08, 0.05, n)
+    samples = allocation.sample_portfolios(n, 50000, seed=3)
+    _, vol, sharpe = allocation.portfolio_stats(samples, mu, cov)
+
+    weights = allocation.min_variance_weights(cov)
+    _, best_vol, _ = allocation.portfolio_stats(weights, mu, cov)
+    assert weights.min() >= 0 and np.isclose(weights.sum(), 1)
+    assert best_vol[0] <= vol.min() + 1e-12
+
+    weights = allocation.max_sharpe_weights(mu, cov)
+    _, _, best_sharpe = allocation.portfolio_stats(weights, mu, cov)
+    assert weights.min() >= 0 and np.isclose(weights.sum(), 1)
+    assert best_sharpe[0] >= sharpe.max() - 1e-12
+
+
+def test_optimize_reports_exact_strategies():
+    dates = pd.bdate_range("2023-01-02", periods=300)
+    rng = np.random.default_rng(4)
+    returns = rng.multivariate_normal([0.0004, 0.0006, 0.0003], random_cov(3, seed=5) / 252, size=len(dates))
+    panel = pd.DataFrame(100 * np.cumprod(1 + returns, axis=0), index=dates, columns=["A", "B", "C"])
+    panel[allocation.BENCHMARK] = panel.mean(axis=1)
+
+    result = allocation.optimize(panel, n_portfolios=2000)
+    mu, cov = allocation.annualized_moments(panel[["A", "B", "C"]])
+
+    assert list(result["weights"].index) == ["A", "B", "C"]
+    np.testing.assert_allclose(result["weights"]["min_variance"], allocation.min_variance_weights(cov))
+    np.testing.assert_allclose(result["weights"]["max_sharpe"], allocation.max_sharpe_weights(mu, cov))
@@ -1,4 +1,6 @@
 import os
+import sys
+import time
 import asyncio
 import pandas as pd
 from dotenv import load_dotenv
@@ -11,50 +13,93 @@ from autogen_agentchat.teams import RoundRobinGroupChat
 from autogen_agentchat.messages import TextMessage
 from autogen_ext.models.openai import OpenAIChatCompletionClient
 from autogen_ext.agents.web_surfer import MultimodalWebSurfer
+from autogen_core.models import UserMessage
+
+# 共用工具放在專案根目錄的 common/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from common.digest import digest_chunk
+from common.prompt_encoder import encode_frame, token_savings
+from common.search_cache import SearchCache, run_web_research
+from common.conversation_log import ConversationLogWriter, compact_log
+from common.budget import BudgetedRun, budget_from_env, build_termination
+from common.chunk_cache import ChunkCache
+from common.telemetry import Telemetry
+from common.replay_client import wrap_from_env
 
 load_dotenv()
 
-async def process_chunk(chunk, start_idx, total_records, model_client, termination_condition):
+# 修改 process_chunk 的 prompt 時請一併更新版本，舊的批次快取就會失效
+PROMPT_VERSION = "v1"
+
+# 所有批次共用的外部搜尋主題
+RESEARCH_QUERY = "請搜尋最新寶寶照護建議資訊（例如餵食、睡眠、尿布更換等），並整理重點與參考來源。"
+
+async def process_chunk(chunk, start_idx, total_records, model_client, termination_condition, include_raw=False, research_notes=None, log_writer=None, headless=False, timeout_seconds=None, telemetry=None):
     """
     處理單一批次資料：
-      - 將該批次資料轉成 dict 格式
+      - 將該批次資料壓縮成統計摘要 (分佈、時間分桶、趨勢與離群值)；
+        include_raw=True 時才額外附上原始資料
       - 組出提示，要求各代理人根據該批次資料進行分析，
         並提供寶寶照護建議。
       - 請 MultimodalWebSurfer 代理人利用外部網站搜尋功能，
         搜尋最新寶寶照護建議資訊（例如餵食、睡眠、尿布更換等），
-        並將搜尋結果納入建議中。
-      - 收集所有回覆訊息並返回。
+        並將搜尋結果納入建議中；若已傳入 research_notes (事先搜尋好的結果)，
+        則直接將其放入提示，不再為每個批次重複搜尋。
+      - 依預算執行 (termination_condition 加上 timeout_seconds 的時間上限)；
+        headless=True 時不加入 UserProxyAgent，無人值守執行不會卡在等待輸入。
+      - 每則回覆與最後的 StopReason 紀錄直接寫入 log_writer，不在記憶體中累積整段對話；
+        回傳這個批次的摘要 (最後一則回覆、token 累計、終止原因與是否逾時)。
     """
-    # 將資料轉成 dict 格式
-    chunk_data = chunk.to_dict(orient='records')
+    # 預設只提供統計摘要，原始資料需明確要求才放入 prompt
+    chunk_data = digest_chunk(chunk)
+    if include_raw:
+        raw_data = encode_frame(chunk)
+        savings = token_savings(chunk, raw_data)
+        print(f"[batch {start_idx}] raw data tokens: {savings['encoded_tokens']} (records 格式 {savings['baseline_tokens']}，節省 {savings['saved_ratio']:.0%})")
+        chunk_data += f"\n\n原始資料 (TSV):\n{raw_data}"
+
+    if research_notes:
+        research_step = (
+            "  2. 以下為事先搜尋好的最新寶寶照護建議資訊，請將其整合進回覆中：\n"
+            f"{research_notes}\n"
+        )
+    else:
+        research_step = (
+            "  2. 請 MultimodalWebSurfer 搜尋外部網站，找出最新的寶寶照護建議資訊（例如餵食、睡眠、尿布更換等），\n"
+            "     並將搜尋結果整合進回覆中；\n"
+        )
     prompt = (
         f"目前正在處理第 {start_idx} 至 {start_idx + len(chunk) - 1} 筆資料（共 {total_records} 筆）。\n"
-        f"以下為該批次資料:\n{chunk_data}\n\n"
+        f"以下為該批次資料摘要:\n{chunk_data}\n\n"
         "請根據以上資料進行分析，並提供完整的寶寶照護建議。"
         "其中請特別注意：\n"
         "  1. 分析寶寶的日常行為與照護需求；\n"
-        "  2. 請 MultimodalWebSurfer 搜尋外部網站，找出最新的寶寶照護建議資訊（例如餵食、睡眠、尿布更換等），\n"
-        "     並將搜尋結果整合進回覆中；\n"
+        f"{research_step}"
         "  3. 最後請提供具體的建議和相關參考資訊。\n"
         "請各代理人協同合作，提供一份完整且具參考價值的建議。"
     )
     
     # 為每個批次建立新的 agent 與 team 實例
     local_data_agent = AssistantAgent("data_agent", model_client)
-    local_web_surfer = MultimodalWebSurfer("web_surfer", model_client)
     local_assistant = AssistantAgent("assistant", model_client)
-    local_user_proxy = UserProxyAgent("user_proxy")
-    local_team = RoundRobinGroupChat(
-        [local_data_agent, local_web_surfer, local_assistant, local_user_proxy],
-        termination_condition=termination_condition
-    )
+    participants = [local_data_agent, local_assistant]
+    if not research_notes:
+        participants.insert(1, MultimodalWebSurfer("web_surfer", model_client))
+    if not headless:
+        # 無人值守 (headless) 時不加入會等待輸入的 UserProxyAgent
+        participants.append(UserProxyAgent("user_proxy"))
+    local_team = RoundRobinGroupChat(participants, termination_condition=termination_condition)
     
-    messages = []
-    async for event in local_team.run_stream(task=prompt):
+    run = BudgetedRun(local_team, prompt, timeout_seconds=timeout_seconds)
+    # 有傳入 telemetry 時記錄每則訊息的耗時與 token
+    stream = run if telemetry is None else telemetry.track(run, start_idx)
+    # 完整對話只寫進 log_writer，記憶體中只保留摘要需要的最後回覆與 token 累計
+    last_reply = None
+    message_count = 0
+    prompt_tokens = completion_tokens = 0
+    async for event in stream:
         if isinstance(event, TextMessage):
-            # 印出目前哪個 agent 正在運作，方便追蹤
-            print(f"[{event.source}] => {event.content}\n")
-            messages.append({
+            message = {
                 "batch_start": start_idx,
                 "batch_end": start_idx + len(chunk) - 1,
                 "source": event.source,
@@ -62,8 +107,134 @@ async def process_chunk(chunk, start_idx, total_records, model_client, terminati
                 "type": event.type,
                 "prompt_tokens": event.models_usage.prompt_tokens if event.models_usage else None,
                 "completion_tokens": event.models_usage.completion_tokens if event.models_usage else None
-            })
-    return messages
+            }
+            if log_writer is not None:
+                # 每則訊息一產生就寫入紀錄檔
+                await log_writer.put(message)
+            else:
+                # 印出目前哪個 agent 正在運作，方便追蹤
+                print(f"[{event.source}] => {event.content}\n")
+            message_count += 1
+            prompt_tokens += message["prompt_tokens"] or 0
+            completion_tokens += message["completion_tokens"] or 0
+            if event.source != "user":
+                last_reply = message
+
+    # 記錄這個批次的終止原因 (終止條件、token/輪數上限或逾時)
+    stop_message = {
+        "batch_start": start_idx,
+        "batch_end": start_idx + len(chunk) - 1,
+        "source": "system",
+        "content": run.stop_reason,
+        "type": "StopReason",
+        "prompt_tokens": None,
+        "completion_tokens": None,
+        "timed_out": run.timed_out
+    }
+    print(f"[batch {start_idx}] stopped: {run.stop_reason} ({run.elapsed:.1f}s)")
+    if log_writer is not None:
+        await log_writer.put(stop_message)
+
+    # 回傳的摘要與 synthesize_analysis 使用的訊息格式相同 (batch_start / batch_end / content)
+    return {
+        "batch_start": start_idx,
+        "batch_end": start_idx + len(chunk) - 1,
+        "source": last_reply["source"] if last_reply else "system",
+        "content": last_reply["content"] if last_reply else "",
+        "type": "ChunkSummary",
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "messages": message_count,
+        "stop_reason": run.stop_reason,
+        "timed_out": run.timed_out
+    }
+
+# 各模型每百萬 token 的價格 (USD)，用來估算兩階段流程各層的成本
+MODEL_PRICING = {
+    "gemini-1.5-flash-8b": {"prompt": 0.0375, "completion": 0.15},
+    "gemini-2.0-flash": {"prompt": 0.10, "completion": 0.40},
+}
+
+async def _timed_create(model_client, prompt):
+    start = time.monotonic()
+    response = await model_client.create([UserMessage(content=prompt, source="user")])
+    latency = time.monotonic() - start
+    usage = response.usage
+    return response.content, usage.prompt_tokens, usage.completion_tokens, latency
+
+async def extract_chunk_facts(chunk, start_idx, total_records, model_client):
+    """
+    兩階段流程的第一階段 (extract)：
+      - 以便宜的模型對單一批次的統計摘要做一次呼叫，只萃取關鍵事實，不做建議
+      - 回傳一筆標記 phase="extract" 的訊息，包含 token 數與延遲
+    """
+    prompt = (
+        f"以下為寶寶日誌第 {start_idx} 至 {start_idx + len(chunk) - 1} 筆資料（共 {total_records} 筆）的統計摘要:\n"
+        f"{digest_chunk(chunk)}\n\n"
+        "請只條列出這批資料中與寶寶作息、餵食、睡眠、尿布相關的關鍵事實與異常現象，"
+        "每點一行、附上數據，不需要提供建議。"
+    )
+    content, prompt_tokens, completion_tokens, latency = await _timed_create(model_client, prompt)
+    return {
+        "phase": "extract",
+        "batch_start": start_idx,
+        "batch_end": start_idx + len(chunk) - 1,
+        "source": "fact_extractor",
+        "content": content,
+        "type": "TextMessage",
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "latency": latency
+    }
+
+async def synthesize_analysis(fact_messages, total_records, model_client, research_notes=None):
+    """
+    兩階段流程的第二階段 (synthesize)：
+      - 由較強的模型彙整所有批次萃取出的事實，產生最終的寶寶照護分析與建議
+      - 回傳一筆標記 phase="synthesize" 的訊息
+    """
+    facts = "\n\n".join(
+        f"[第 {msg['batch_start']}-{msg['batch_end']} 筆]\n{msg['content']}"
+        for msg in sorted(fact_messages, key=lambda m: m["batch_start"])
+    )
+    prompt = (
+        f"以下為寶寶日誌（共 {total_records} 筆）各批次萃取出的關鍵事實:\n{facts}\n\n"
+        + (f"最新寶寶照護建議資訊:\n{research_notes}\n\n" if research_notes else "")
+        + "請綜合以上內容，分析寶寶的日常行為與照護需求，並提供具體的建議和相關參考資訊。"
+    )
+    content, prompt_tokens, completion_tokens, latency = await _timed_create(model_client, prompt)
+    return {
+        "phase": "synthesize",
+        "batch_start": 0,
+        "batch_end": total_records - 1,
+        "source": "analysis_synthesizer",
+        "content": content,
+        "type": "TextMessage",
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "latency": latency
+    }
+
+def tier_report(messages, model_names):
+    """
+    依 phase 彙總各層的呼叫次數、token、延遲與估算成本。
+    model_names: {"extract": "gemini-1.5-flash-8b", "synthesize": "gemini-2.0-flash"}
+    """
+    df = pd.DataFrame(messages)
+    report = df.groupby("phase").agg(
+        calls=("content", "size"),
+        prompt_tokens=("prompt_tokens", "sum"),
+        completion_tokens=("completion_tokens", "sum"),
+        total_latency=("latency", "sum"),
+        max_latency=("latency", "max"),
+    )
+    report["model"] = report.index.map(model_names)
+    pricing = report["model"].map(lambda m: MODEL_PRICING.get(m, {"prompt": 0.0, "completion": 0.0}))
+    report["cost_usd"] = (
+        report["prompt_tokens"] * pricing.map(lambda p: p["prompt"])
+        + report["completion_tokens"] * pricing.map(lambda p: p["completion"])
+    ) / 1_000_000
+    return report
 
 async def main():
     gemini_api_key = os.environ.get("GEMINI_API_KEY")
@@ -72,40 +243,71 @@ async def main():
         return
 
     # 初始化模型用戶端 (此處示範使用 gemini-2.0-flash)
-    model_client = OpenAIChatCompletionClient(
+    # 設定 MODEL_REPLAY_MODE 時改用錄製 / 重播用戶端，可離線重跑
+    model_client = wrap_from_env(OpenAIChatCompletionClient(
         model="gemini-2.0-flash",
         api_key=gemini_api_key,
-    )
+    ))
     
-    termination_condition = TextMentionTermination("exit")
+    # 預算設定 (輪數、token、每批次時間上限、headless) 由 .env 控制
+    budget = budget_from_env()
     
     # 使用 pandas 以 chunksize 方式讀取 CSV 檔案
     csv_file_path = "cuboai_baby_diary.csv"
     chunk_size = 1000
     chunks = list(pd.read_csv(csv_file_path, chunksize=chunk_size))
     total_records = sum(chunk.shape[0] for chunk in chunks)
+
+    # 分派批次前先搜尋一次，結果存在磁碟快取，所有批次與之後的執行共用
+    research_notes = await run_web_research(RESEARCH_QUERY, model_client, SearchCache())
     
-    # 利用 map 與 asyncio.gather 同時處理所有批次（避免使用傳統 for 迴圈）
-    tasks = list(map(
-        lambda idx_chunk: process_chunk(
-            idx_chunk[1],
-            idx_chunk[0] * chunk_size,
-            total_records,
-            model_client,
-            termination_condition
-        ),
-        enumerate(chunks)
-    ))
-    
-    results = await asyncio.gather(*tasks)
-    # 將所有批次的訊息平坦化成一個清單
-    all_messages = [msg for batch in results for msg in batch]
-    
-    # 將對話紀錄整理成 DataFrame 並存成 CSV
-    df_log = pd.DataFrame(all_messages)
+    # 批次結果依內容雜湊快取，重跑時只有新增或變動的批次會呼叫代理人
+    chunk_cache = ChunkCache(PROMPT_VERSION, context=[research_notes])
+    telemetry = Telemetry()
+
+    # 對話紀錄邊產生邊寫入 JSONL，單一批次失敗也不會遺失其他批次的訊息
+    log_file = "all_conversation_log.jsonl"
+    async with ConversationLogWriter(log_file) as log_writer:
+        # 利用 map 與 asyncio.gather 同時處理所有批次（避免使用傳統 for 迴圈）
+        tasks = list(map(
+            lambda idx_chunk: chunk_cache.get_or_run(
+                idx_chunk[1],
+                idx_chunk[0] * chunk_size,
+                lambda: process_chunk(
+                    idx_chunk[1],
+                    idx_chunk[0] * chunk_size,
+                    total_records,
+                    model_client,
+                    # 終止條件有狀態，每個批次各自建立
+                    build_termination(budget["max_turns"], budget["max_tokens"]),
+                    research_notes=research_notes,
+                    log_writer=log_writer,
+                    headless=budget["headless"],
+                    timeout_seconds=budget["timeout_seconds"],
+                    telemetry=telemetry
+                ),
+                log_writer=log_writer,
+                # 逾時中斷的批次結果不完整，不寫入快取
+                cache_if=lambda summary: not summary["timed_out"]
+            ),
+            enumerate(chunks)
+        ))
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for idx, result in enumerate(results):
+            if isinstance(result, Exception):
+                print(f"第 {idx * chunk_size} 筆開始的批次處理失敗：{result}")
+
+    # 將本次執行的紀錄整理成最終 CSV
     output_file = "all_conversation_log.csv"
-    df_log.to_csv(output_file, index=False, encoding="utf-8-sig")
-    print(f"已將所有對話紀錄輸出為 {output_file}")
+    compact_log(log_file, output_file, run_id=log_writer.run_id)
+    print(f"批次快取命中 {chunk_cache.hits} 個，重新分析 {chunk_cache.misses} 個")
+
+    # 匯出各代理人的耗時與 token (trace 可用 chrome://tracing 或 Perfetto 開啟)
+    telemetry.to_chrome_trace("telemetry_trace.json")
+    telemetry.to_summary_csv("telemetry_summary.csv")
+    print(telemetry.kind_totals())
+    print(f"已將 {log_writer.count} 則對話紀錄輸出為 {output_file}")
 
 if __name__ == '__main__':
     asyncio.run(main())
\ No newline at end of file
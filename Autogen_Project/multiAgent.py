@@ -1,4 +1,5 @@
 import os
+import sys
 from dotenv import load_dotenv
 import asyncio
 
@@ -12,6 +13,10 @@ from autogen_agentchat.ui import Console
 from autogen_ext.models.openai import OpenAIChatCompletionClient
 from autogen_ext.agents.web_surfer import MultimodalWebSurfer
 
+# 共用工具放在專案根目錄的 common/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from common.budget import BudgetedRun, budget_from_env, build_termination
+
 async def main():
     # 從 .env 讀取 Gemini API 金鑰
     gemini_api_key = os.environ.get("GEMINI_API_KEY")
@@ -25,19 +30,26 @@ async def main():
     # 建立各代理人
     assistant = AssistantAgent("assistant", model_client)
     web_surfer = MultimodalWebSurfer("web_surfer", model_client)
-    user_proxy = UserProxyAgent("user_proxy")
+    participants = [web_surfer, assistant]
+
+    # 預算設定 (輪數、token、時間上限、headless) 由 .env 控制
+    budget = budget_from_env()
+    if not budget["headless"]:
+        participants.append(UserProxyAgent("user_proxy"))
     
-    # 當對話中出現 "exit" 時即終止對話
-    termination_condition = TextMentionTermination("exit")
+    # 當對話中出現 "exit"，或達到輪數 / token 上限時即終止對話
+    termination_condition = build_termination(budget["max_turns"], budget["max_tokens"])
     
     # 建立一個循環團隊，讓各代理人依序參與討論
     team = RoundRobinGroupChat(
-        [web_surfer, assistant, user_proxy],
+        participants,
         termination_condition=termination_condition
     )
     
     # 啟動團隊對話，任務是「搜尋 Gemini 的相關資訊，並撰寫一份簡短摘要」
-    await Console(team.run_stream(task="請搜尋 Gemini 的相關資訊，並撰寫一份簡短摘要。"))
+    run = BudgetedRun(team, "請搜尋 Gemini 的相關資訊，並撰寫一份簡短摘要。", timeout_seconds=budget["timeout_seconds"])
+    await Console(aiter(run))
+    print(f"對話結束原因：{run.stop_reason}（{run.elapsed:.1f} 秒）")
 
 if __name__ == '__main__':
     asyncio.run(main())
\ No newline at end of file
@@ -1,36 +1,61 @@
 import os
+import sys
 import asyncio
 import pandas as pd
 import gradio as gr
 from dotenv import load_dotenv
 from autogen_ext.models.openai import OpenAIChatCompletionClient
-from dataAgent import process_chunk, TextMentionTermination
+from dataAgent import extract_chunk_facts, synthesize_analysis, tier_report
+
+# 共用工具放在專案根目錄的 common/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from common.replay_client import wrap_from_env
 
 load_dotenv()
 
-async def run_analysis(csv_file_path, chunk_size):
+EXTRACT_MODEL = "gemini-1.5-flash-8b"
+SYNTHESIZE_MODEL = "gemini-2.0-flash"
+
+async def run_analysis(csv_file_path, chunk_size, max_concurrency=16):
     gemini_api_key = os.getenv("GEMINI_API_KEY")
-    model_client_8b = OpenAIChatCompletionClient("gemini-1.5-flash-8b", gemini_api_key)
-    model_client_flash = OpenAIChatCompletionClient("gemini-2.0-flash", gemini_api_key)
-    termination_condition = TextMentionTermination("exit")
+    # 便宜的 8b 模型負責各批次的事實萃取，flash 模型負責最後的綜合分析
+    model_client_8b = wrap_from_env(OpenAIChatCompletionClient(model=EXTRACT_MODEL, api_key=gemini_api_key))
+    model_client_flash = wrap_from_env(OpenAIChatCompletionClient(model=SYNTHESIZE_MODEL, api_key=gemini_api_key))
 
     chunks = list(pd.read_csv(csv_file_path, chunksize=chunk_size))
     total_records = sum(chunk.shape[0] for chunk in chunks)
 
-    tasks = [
-        process_chunk(chunk, idx * chunk_size, total_records, model_client_8b, model_client_flash, termination_condition)
-        for idx, chunk in enumerate(chunks)
-    ]
+    # 第一階段：以 semaphore 限制同時呼叫數，高併發萃取每個批次的事實
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def extract(idx, chunk):
+        async with semaphore:
+            return await extract_chunk_facts(chunk, idx * chunk_size, total_records, model_client_8b)
+
+    tasks = [extract(idx, chunk) for idx, chunk in enumerate(chunks)]
 
-    results = []
+    all_messages = []
     for coro in asyncio.as_completed(tasks):
-        chunk_messages = await coro
-        for msg in chunk_messages:
-            phase = msg['phase']
-            source = msg['source']
-            batch_range = f"{msg['batch_start']}-{msg['batch_end']}"
-            content = msg['content']
-            yield f"[{phase.upper()}][{batch_range}][{source}] {content}"
+        msg = await coro
+        all_messages.append(msg)
+        yield format_message(msg)
+
+    # 第二階段：flash 模型根據所有萃取出的事實產生最終分析
+    fact_messages = list(all_messages)
+    final_msg = await synthesize_analysis(fact_messages, total_records, model_client_flash)
+    all_messages.append(final_msg)
+    yield format_message(final_msg)
+
+    # 各層的成本與延遲
+    report = tier_report(all_messages, {"extract": EXTRACT_MODEL, "synthesize": SYNTHESIZE_MODEL})
+    yield f"[REPORT]\n{report.to_string()}"
+
+def format_message(msg):
+    phase = msg['phase']
+    source = msg['source']
+    batch_range = f"{msg['batch_start']}-{msg['batch_end']}"
+    content = msg['content']
+    return f"[{phase.upper()}][{batch_range}][{source}][{msg['latency']:.1f}s] {content}"
 
 async def analyze_file(file_obj):
     csv_file_path = file_obj.name
@@ -48,4 +73,4 @@ iface = gr.Interface(
     allow_flagging= "auto",
 )
 
-iface.launch()
\ No newline at end of file
+iface.launch()
@@ -1,4 +1,5 @@
 import os
+import sys
 import yfinance as yf
 import numpy as np
 import pandas as pd
@@ -13,6 +14,13 @@ from autogen_agentchat.teams import RoundRobinGroupChat
 from autogen_agentchat.messages import TextMessage
 from autogen_ext.agents.web_surfer import MultimodalWebSurfer
 
+# 共用工具放在專案根目錄的 common/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from common.indicators import indicator_cache
+from common.chart_renderer import chart_renderer
+
+# 50 / 200 日均線，波動率取最近一年的日報酬
+INDICATOR_PARAMS = {"sma": (50, 200), "volatility": 252}
 
 # 載入 API 金鑰
 load_dotenv()
@@ -71,12 +79,13 @@ class StockAnalysisAssistant:
             self.analysis_result = "查無股價資料。"
             return
 
-        # 計算指標
+        # 計算指標 (共用指標引擎，同一檔股票同一天只算一次)
+        hist = indicator_cache.get_or_compute(self.ticker, hist, INDICATOR_PARAMS)
         current_price = stock.info.get("currentPrice", hist["Close"].iloc[-1])
         year_high = stock.info.get("fiftyTwoWeekHigh", hist["High"].max())
         year_low = stock.info.get("fiftyTwoWeekLow", hist["Low"].min())
-        ma_50 = hist["Close"].rolling(window=50).mean().iloc[-1]
-        ma_200 = hist["Close"].rolling(window=200).mean().iloc[-1]
+        ma_50 = hist["SMA50"].iloc[-1]
+        ma_200 = hist["SMA200"].iloc[-1]
 
         ytd_start = datetime(end_date.year, 1, 1, tzinfo=pytz.timezone("UTC"))
         ytd_data = hist.loc[ytd_start:]
@@ -86,8 +95,7 @@ class StockAnalysisAssistant:
         else:
             price_change = percent_change = np.nan
 
-        daily_returns = hist["Close"].pct_change().dropna()
-        volatility = daily_returns.std() * np.sqrt(252)
+        volatility = hist["Volatility"].iloc[-1]
 
         trend = "Upward" if ma_50 > ma_200 else "Downward" if ma_50 < ma_200 else "Neutral"
 
@@ -104,17 +112,15 @@ class StockAnalysisAssistant:
         )
 
         # 畫圖
-        hist["MA_50"] = hist["Close"].rolling(window=50).mean()
-        hist["MA_200"] = hist["Close"].rolling(window=200).mean()
         plot_hist = hist.loc[end_date - timedelta(days=365):]
         fig = go.Figure()
         fig.add_trace(go.Scatter(x=plot_hist.index, y=plot_hist["Close"], mode='lines', name='Close Price'))
-        fig.add_trace(go.Scatter(x=plot_hist.index, y=plot_hist["MA_50"], mode='lines', name='50-Day MA'))
-        fig.add_trace(go.Scatter(x=plot_hist.index, y=plot_hist["MA_200"], mode='lines', name='200-Day MA'))
+        fig.add_trace(go.Scatter(x=plot_hist.index, y=plot_hist["SMA50"], mode='lines', name='50-Day MA'))
+        fig.add_trace(go.Scatter(x=plot_hist.index, y=plot_hist["SMA200"], mode='lines', name='200-Day MA'))
         fig.update_layout(title=f'{self.ticker} Stock Price (Past Year)', xaxis_title="Date", yaxis_title="Price ($)", template="plotly_dark")
         
         self.plot_path = os.path.join(CHART_DIR, f"{self.ticker}_stock_chart.png")
-        fig.write_image(self.plot_path)
+        chart_renderer.write(fig, self.plot_path)
 
     async def _analyze_news(self):
         prompt = f"Please search for important news articles related to {self.ticker} stock from the past year. Summarize the key news events."
@@ -1,4 +1,5 @@
 import os
+import sys
 import asyncio
 import pandas as pd
 from dotenv import load_dotenv
@@ -11,6 +12,10 @@ from sklearn.decomposition import PCA
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import silhouette_score
 
+# 共用工具放在專案根目錄的 common/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from common.replay_client import wrap_from_env
+
 load_dotenv()
 
 # gemini 針對履歷上的各項經歷做細項評分
@@ -18,10 +23,11 @@ async def analyze_resume(resume_text):
     api_key = os.getenv('GEMINI_API_KEY')
 
     # 呼叫 gemini 2.0 模型生成內容
-    model_client = OpenAIChatCompletionClient(
+    # 設定 MODEL_REPLAY_MODE 時改用錄製 / 重播用戶端，可離線重跑
+    model_client = wrap_from_env(OpenAIChatCompletionClient(
         model="gemini-2.0-flash",
         api_key=api_key,
-    )
+    ))
 
     prompt = f"""
     請處理以下履歷文本，提取每一項經歷和活動，並按照以下格式輸出：
@@ -139,10 +145,11 @@ def analyze_with_kmeans_pca(df_experience):
 async def analyze_clusters_with_gemini(df_experience):
     api_key = os.getenv('GEMINI_API_KEY')
 
-    model_client = OpenAIChatCompletionClient(
+    # 設定 MODEL_REPLAY_MODE 時改用錄製 / 重播用戶端，可離線重跑
+    model_client = wrap_from_env(OpenAIChatCompletionClient(
         model="gemini-2.0-flash",
         api_key=api_key,
-    )
+    ))
 
     # 整理要輸入的分析資料
     cluster_summary = ""
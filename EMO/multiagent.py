@@ -1,6 +1,6 @@
 import os
+import sys
 import asyncio
-import json
 from dotenv import load_dotenv, find_dotenv
 from flask_socketio import SocketIO
 from google import genai
@@ -8,6 +8,10 @@ from autogen_agentchat.agents import AssistantAgent
 from autogen_agentchat.teams import RoundRobinGroupChat
 from autogen_agentchat.messages import TextMessage
 
+# 共用工具放在專案根目錄的 common/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from common.prompt_encoder import encode_frame, token_savings
+
 # ✅ 載入 .env 並啟用 Gemini 原生用法
 dotenv_path = find_dotenv()
 print(f"✅ 目前使用的 .env 路徑: {dotenv_path}")
@@ -52,11 +56,13 @@ model_client = GeminiChatCompletionClient()
 
 # ✅ 多 Agent 分析流程
 async def process_user_diary(socketio: SocketIO, user_id, user_entries):
-    records = user_entries.to_dict(orient='records')
-    if len(records) > 5:
-        prompt_records = json.dumps(records[:5], ensure_ascii=False, indent=2, default=str) + "\n... (以下省略)"
-    else:
-        prompt_records = json.dumps(records, ensure_ascii=False, indent=2, default=str)
+    # 以 TSV 格式放入 prompt，欄位名稱只出現一次
+    prompt_entries = user_entries.head(5)
+    prompt_records = encode_frame(prompt_entries)
+    if len(user_entries) > 5:
+        prompt_records += "\n... (以下省略)"
+    savings = token_savings(prompt_entries, prompt_records)
+    print(f"✅ 日記 prompt tokens: {savings['encoded_tokens']}（原 JSON {savings['baseline_tokens']}，節省 {savings['saved_ratio']:.0%}）")
 
     prompt = (
         f"目前正在處理用戶 {user_id} 的日記，共 {len(user_entries)} 則。\n"
@@ -1,4 +1,5 @@
 import os
+import time
 import asyncio
 import pandas as pd
 import threading
@@ -7,57 +8,95 @@ import io
 import gradio as gr
 import streamlit as st
 from utils.finance import fetch_stock_data
-from utils.agent import analyze_stock, model_client, termination_condition, summarize_with_gemini
-from utils.pdf_generator import generate_pdf_report
+from utils.analysis_cache import ANALYSIS_CACHE_HOURS, analysis_job, analysis_key
+from utils.jobs import job_manager
+from utils.pdf_generator import cached_pdf_report, report_key
 from utils.add_todolist import add_todolist
 
 
+# 分析進行中時，每隔幾秒重新整理一次頁面顯示進度
+POLL_SECONDS = 2
+
 # 1. UI 輸入
 st.title("📈 Stock Analysis Multi-Agent")
 ticker = st.text_input("請輸入美股股票代碼（如 AAPL）")
 days = st.number_input("請輸入想要繪製的股價圖天數（90–365）", min_value=90, max_value=365, value=180, step=1)
+force_refresh = st.checkbox(f"強制重新分析（忽略 {ANALYSIS_CACHE_HOURS:g} 小時內的今日分析結果）")
 submit = st.button("開始分析")
 
 # 預設 session_state
 if "analysis_data" not in st.session_state:
     st.session_state.analysis_data = None
+if "job" not in st.session_state:
+    st.session_state.job = None
 
-# 使用者按下分析按鈕
+# 使用者按下分析按鈕：抓股價後把代理人分析丟到背景 job，頁面不必卡在 spinner
 if submit:
     if not ticker:
         st.warning("請輸入完整資訊")
     else:
-        with st.spinner("正在分析中..."):
-            try:
-                # 抓股票資料
-                data = fetch_stock_data(ticker.upper(), days=days)
-
-                # 取得 AI 分析訊息
-                messages = asyncio.run(analyze_stock(
-                    ticker=ticker.upper(),
-                    indicators=data["indicators"],
-                    model_client=model_client,
-                    termination_condition=termination_condition
-                ))
-
-                # Gemini 模型整理成表格
-                df = asyncio.run(summarize_with_gemini(messages))
-
-                # ✅ 存入 session_state
-                st.session_state.analysis_data = {
-                    "ticker": ticker.upper(),
-                    "days": days,
-                    "stock_name": data["name"],
-                    "indicators": data["indicators"],
-                    "figure": data["figure"],
-                    "df": df,
-                }
-
-                st.success("✅ 分析完成！請查看下方報告")
-
-            except Exception as e:
-                st.error(f"分析失敗：{e}")
-                st.session_state.analysis_data = None
+        try:
+            # 抓股票資料
+            data = fetch_stock_data(ticker.upper(), days=days)
+
+            # 取得 AI 分析結果並整理成五段表格 (今天已分析過的股票直接取快取；多人同時查同一檔只跑一次)
+            job_id = job_manager.submit(
+                analysis_job, ticker.upper(), data["indicators"], force_refresh=force_refresh,
+                key=analysis_key(ticker), label=ticker.upper()
+            )
+            st.session_state.job = {"id": job_id, "ticker": ticker.upper(), "days": days, "data": data}
+            st.session_state.analysis_data = None
+        except Exception as e:
+            st.error(f"分析失敗：{e}")
+            st.session_state.analysis_data = None
+
+# 有進行中的分析時輪詢進度，完成後存入 session_state
+if st.session_state.get("job"):
+    pending = st.session_state.job
+    job = job_manager.get(pending["id"])
+    snapshot = job.snapshot() if job is not None else {"state": "failed", "error": "找不到分析工作"}
+
+    if snapshot["state"] in ("pending", "running"):
+        st.info(f"⏳ {pending['ticker']} 分析中（{snapshot['elapsed']:.0f} 秒）：{snapshot['progress']}")
+        with st.expander(f"代理人訊息（{len(snapshot['messages'])} 則）"):
+            for message in snapshot["messages"]:
+                st.markdown(f"**[{message['step']}] {message['source']}**")
+                st.write(message["content"])
+        time.sleep(POLL_SECONDS)
+        st.rerun()
+
+    st.session_state.job = None
+    if snapshot["state"] == "done":
+        analysis = snapshot["result"]
+        data = pending["data"]
+        df = analysis["df"]
+        # 報告內容以分析當時的指標為準
+        data["indicators"] = analysis["indicators"]
+
+        # ✅ 存入 session_state
+        st.session_state.analysis_data = {
+            "ticker": pending["ticker"],
+            "days": pending["days"],
+            "stock_name": data["name"],
+            "indicators": data["indicators"],
+            "figure": data["figure"],
+            "df": df,
+        }
+        # PDF 快取用的雜湊值只在分析完成時算一次
+        st.session_state.analysis_data["pdf_key"] = report_key(
+            df,
+            {"ticker": pending["ticker"], "days": pending["days"]},
+            data["indicators"],
+            data["figure"]
+        )
+
+        age_minutes = (time.time() - analysis["created_at"]) / 60
+        if age_minutes >= 1:
+            st.info(f"使用 {age_minutes:.0f} 分鐘前的分析結果（勾選「強制重新分析」可重新產生）")
+        st.success("✅ 分析完成！請查看下方報告")
+    else:
+        st.error(f"分析失敗：{snapshot.get('error')}")
+        st.session_state.analysis_data = None
 
 # 無論如何，只要有分析結果就顯示
 if st.session_state.analysis_data:
@@ -70,25 +109,25 @@ if st.session_state.analysis_data:
     st.plotly_chart(result["figure"])
     st.subheader("📊 AI 分析報告")
 
-    # 匯出 PDF
-    pdf_path = generate_pdf_report(
+    # 匯出 PDF (同一份分析結果只產生一次，按其他按鈕觸發 rerun 時直接取快取)
+    pdf_bytes = cached_pdf_report(
         result["df"],
         {"ticker": result["ticker"], "days": result["days"]},
         result["indicators"],
-        result["figure"]
+        result["figure"],
+        key=result["pdf_key"]
     )
 
     # 並排兩個按鈕
     col1, col2 = st.columns([1, 1])
 
     with col1:
-        with open(pdf_path, "rb") as f:
-            st.download_button(
-                label="📥 下載 PDF 報告",
-                data=f,
-                file_name=f"{result['ticker']}_AI_分析報告.pdf",
-                mime="application/pdf"
-            )
+        st.download_button(
+            label="📥 下載 PDF 報告",
+            data=pdf_bytes,
+            file_name=f"{result['ticker']}_AI_分析報告.pdf",
+            mime="application/pdf"
+        )
 
     with col2:
         if st.button("📌 加入追蹤清單"):
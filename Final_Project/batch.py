@@ -0,0 +1,118 @@
+"""
+追蹤清單批次分析：一次產生多檔股票的 AI 分析報告。
+
+    python batch.py AAPL MSFT NVDA
+    python batch.py --file watchlist.txt --concurrency 4 --days 180
+
+每檔股票依序執行 抓股價 / 指標 → 代理人分析 → 整理段落 → 匯出 PDF，
+多檔股票之間並行 (最多 --concurrency 檔同時進行)，共用同一個 model_client。
+輸出到 reports/<日期>/：每檔一份 <TICKER>.pdf，加上彙整的 index.csv。
+"""
+import os
+import time
+import asyncio
+import argparse
+import datetime
+import pandas as pd
+
+from utils.finance import fetch_stock_data
+from utils.agent import budget, build_termination, model_client
+from utils.analysis_cache import cached_analysis_async
+from utils.pdf_generator import generate_pdf_report
+from utils.add_todolist import add_todolist
+
+REPORT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reports")
+
+
+def load_watchlist(path: str) -> list:
+    """每行一個代碼，# 開頭為註解；也接受以逗號分隔。"""
+    tickers = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0]
+            tickers.extend(t.strip().upper() for t in line.split(",") if t.strip())
+    return tickers
+
+
+async def analyze_ticker(ticker: str, days: int, out_dir: str, semaphore: asyncio.Semaphore,
+                         force_refresh: bool = False) -> dict:
+    row = {"ticker": ticker, "name": "", "status": "ok", "suggestion": "", "pdf": "", "seconds": 0.0, "error": ""}
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            # yfinance / 指標計算是同步的，丟到 thread 避免卡住其他股票的代理人
+            data = await asyncio.to_thread(fetch_stock_data, ticker, days)
+            row["name"] = data["name"]
+
+            # 終止條件帶有狀態，每檔股票各建一份；批次執行沒有人輸入，一律 headless
+            # 今天已分析過 (例如網頁上有人查過) 的股票直接取快取
+            analysis = await cached_analysis_async(
+                ticker,
+                data["indicators"],
+                model_client,
+                build_termination(budget["max_turns"], budget["max_tokens"]),
+                force_refresh=force_refresh,
+                headless=True,
+            )
+            df = analysis["df"]
+            data["indicators"] = analysis["indicators"]
+
+            suggestion = [item for item in df["suggestion"].tolist() if item.strip()]
+            row["suggestion"] = suggestion[0].lstrip("-• ").strip() if suggestion else ""
+
+            pdf_path = os.path.join(out_dir, f"{ticker}.pdf")
+            await asyncio.to_thread(
+                generate_pdf_report, df, {"ticker": ticker, "days": days}, data["indicators"], data["figure"], pdf_path
+            )
+            row["pdf"] = pdf_path
+        except Exception as e:
+            # 單檔失敗不影響其他股票，記錄在 index 裡
+            row["status"] = "failed"
+            row["error"] = f"{type(e).__name__}: {e}"
+            print(f"❌ [{ticker}] 分析失敗：{e}")
+        row["seconds"] = round(time.perf_counter() - started, 1)
+    print(f"[{ticker}] {row['status']}（{row['seconds']} 秒）")
+    return row
+
+
+async def run_batch(tickers: list, days: int = 180, concurrency: int = 4, out_dir: str = None,
+                    force_refresh: bool = False) -> pd.DataFrame:
+    tickers = list(dict.fromkeys(t.upper() for t in tickers))
+    out_dir = out_dir or os.path.join(REPORT_ROOT, datetime.date.today().isoformat())
+    os.makedirs(out_dir, exist_ok=True)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    rows = await asyncio.gather(*(analyze_ticker(t, days, out_dir, semaphore, force_refresh) for t in tickers))
+
+    index = pd.DataFrame(rows)
+    index_path = os.path.join(out_dir, "index.csv")
+    index.to_csv(index_path, index=False, encoding="utf-8-sig")
+    print(f"✅ 完成 {(index['status'] == 'ok').sum()}/{len(index)} 檔，索引已儲存：{index_path}")
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="追蹤清單批次分析")
+    parser.add_argument("tickers", nargs="*", help="股票代碼，例如 AAPL MSFT")
+    parser.add_argument("--file", help="追蹤清單檔案 (每行一個代碼)")
+    parser.add_argument("--days", type=int, default=180, help="股價圖天數")
+    parser.add_argument("--concurrency", type=int, default=4, help="同時分析的股票數")
+    parser.add_argument("--out", help="輸出資料夾 (預設 reports/<今天日期>)")
+    parser.add_argument("--force", action="store_true", help="忽略今日的分析快取，全部重新分析")
+    parser.add_argument("--todoist", action="store_true", help="完成後把成功的股票一次加入 Todoist 追蹤清單")
+    args = parser.parse_args()
+
+    tickers = list(args.tickers)
+    if args.file:
+        tickers += load_watchlist(args.file)
+    if not tickers:
+        parser.error("請提供股票代碼或 --file")
+
+    index = asyncio.run(run_batch(tickers, args.days, args.concurrency, args.out, args.force))
+    if args.todoist:
+        # 同一個瀏覽器 session 一次加入整份清單
+        add_todolist(index.loc[index["status"] == "ok", "ticker"].tolist())
+
+
+if __name__ == "__main__":
+    main()
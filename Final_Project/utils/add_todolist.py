@@ -1,71 +1,34 @@
-from playwright.sync_api import sync_playwright
 import os
-from dotenv import load_dotenv
-
-def add_todolist(task_name: str = "這是預設任務") -> None:
-
-    # 讀取 .env 檔案
-    load_dotenv()
-
-    # 從 .env 讀取 Todoist 帳號和密碼
-    TODOIST_EMAIL = os.getenv("TODOIST_EMAIL")
-    TODOIST_PASSWORD = os.getenv("TODOIST_PASSWORD")
-
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=False)  # 顯示瀏覽器
-        page = browser.new_page()
-
-        print("啟動瀏覽器，開始登入 Todoist...")
-
-        # 進入 Todoist 登入頁面
-        page.goto("https://todoist.com/users/showlogin")
-        page.wait_for_timeout(3000)
-
-        # 使用 .env 讀取帳號密碼
-        page.fill("input[id='element-0']", TODOIST_EMAIL)  # 使用新的 ID 選擇器
-        page.fill("input[id='element-2']", TODOIST_PASSWORD)  # 使用新的 ID 選擇器
-
-        # 按下登入按鈕
-        page.press("input[id='element-2']", "Enter")
-
-        # 等待登入完成
-        page.wait_for_timeout(5000)
-        print("登入成功！")
-        page.screenshot(path="debug_1_after_login.png")
-
-        # 創建新的任務
-        print("開始新增追蹤名單...")
-
-        # 點選「長期追蹤清單」項目
-        page.click("span:has-text('長期追蹤清單')", timeout=5000)
-        page.wait_for_timeout(2000)
-
-        # 點擊「添加任務」按鈕
-        add_task_button = page.locator("button[aria-disabled='false'] span:has-text('添加任務')").first
-        add_task_button.wait_for()
-        add_task_button.click()
-        page.wait_for_timeout(2000)
-
-        # 輸入任務名稱
-        try:
-            task_name_input = page.locator("p[data-placeholder='任務名稱']").first
-            task_name_input.wait_for(state="visible", timeout=10000)  # 增加等待時間
-            task_name_input.fill(task_name)
-            print("任務名稱已輸入！")
-        except Exception as e:
-            print(f"無法找到任務名稱輸入框: {e}")
-
-        # 提交任務
-        try:
-            submit_button = page.locator("button[data-testid='task-editor-submit-button']").first
-            submit_button.wait_for(state="visible", timeout=10000)  # 增加等待時間
-            submit_button.click()
-            print("任務已創建！")
-        except Exception as e:
-            print(f"無法提交任務: {e}")
-
-        page.wait_for_timeout(3000)
-
-        # 關閉瀏覽器
-        browser.close()
-        print("瀏覽器已關閉")
\ No newline at end of file
+import sys
+import asyncio
+
+# 共用工具放在專案根目錄的 common/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from common.browser_pool import BrowserPool
+from common.browser_jobs import TodoistTaskJob
+
+PROJECT_NAME = "長期追蹤清單"
+# 同時開幾個瀏覽器 context 新增任務
+TODOIST_CONCURRENCY = 4
+
+
+async def add_todolist_async(task_names: list, headless: bool = True) -> list:
+    async with BrowserPool(size=TODOIST_CONCURRENCY, headless=headless, name="add_todolist") as pool:
+        return await pool.run_all([TodoistTaskJob(name, project=PROJECT_NAME) for name in task_names])
+
+
+def add_todolist(task_names="這是預設任務", headless: bool = None) -> None:
+    """
+    在 Todoist 的「長期追蹤清單」新增一或多個任務 (task_names 可以是字串或 list)。
+    任務在共用登入狀態的平行瀏覽器 context 中新增；headless 預設讀取 .env 的 TODOIST_HEADLESS (預設 1)。
+    """
+    if isinstance(task_names, str):
+        task_names = [task_names]
+    if headless is None:
+        headless = os.getenv("TODOIST_HEADLESS", "1").lower() in ("1", "true", "yes")
+
+    print(f"開始新增追蹤名單（{len(task_names)} 筆）...")
+    results = asyncio.run(add_todolist_async(task_names, headless))
+    failed = [name for name, result in zip(task_names, results) if isinstance(result, Exception)]
+    if failed:
+        raise RuntimeError(f"無法新增任務：{', '.join(failed)}")
@@ -1,4 +1,6 @@
 import os
+import sys
+import json
 import asyncio
 import pandas as pd
 from dotenv import load_dotenv
@@ -6,36 +8,197 @@ import io
 import re
 
 from autogen_agentchat.agents import AssistantAgent, UserProxyAgent
-from autogen_agentchat.conditions import TextMentionTermination
+from autogen_agentchat.conditions import MaxMessageTermination, TextMentionTermination
 from autogen_agentchat.teams import RoundRobinGroupChat
 from autogen_agentchat.messages import TextMessage
 from autogen_ext.models.openai import OpenAIChatCompletionClient
 from autogen_ext.agents.web_surfer import MultimodalWebSurfer
 from autogen_core.models import UserMessage
 
+# 共用工具放在專案根目錄的 common/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from common.budget import DEFAULT_HEADLESS_MAX_TURNS, BudgetedRun, budget_from_env, build_termination
+from common.telemetry import Telemetry
+from common.replay_client import wrap_from_env
+
 # 載入環境變數
 load_dotenv()
 gemini_api_key = os.getenv("GEMINI_API_KEY")
 
-# 初始化模型用戶端
-model_client = OpenAIChatCompletionClient(
+# 初始化模型用戶端 (設定 MODEL_REPLAY_MODE 時改用錄製 / 重播用戶端，可離線重跑)
+model_client = wrap_from_env(OpenAIChatCompletionClient(
     model="gemini-2.0-flash",
     api_key=gemini_api_key,
-)
+))
+
+# 預算設定 (輪數、token、時間上限、headless) 由 .env 控制
+budget = budget_from_env()
+termination_condition = build_termination(budget["max_turns"], budget["max_tokens"])
+
+# 報告的五個段落 (DataFrame 欄位順序即報告章節順序)
+SECTION_KEYS = ["company", "industry", "financial", "news", "suggestion"]
+
+# 要求 strategy_advisor 直接輸出的 JSON 格式
+SECTION_SCHEMA = """{
+  "company": ["公司背景、主要產品與服務、商業模式、地區布局、主要客戶與合作夥伴，每項一句"],
+  "industry": ["所屬產業、市場趨勢、競爭對手，每項一句"],
+  "financial": ["財務指標、營收、獲利、財務比率、現金流的重點，每項一句"],
+  "news": ["新聞標題：摘要說明"],
+  "suggestion": ["第一項為「買進」、「持有」或「賣出」，其後為評估理由 (成長潛力與風險、財務穩健性、估值、外部環境)"]
+}"""
+
+# 平行模式下搜尋子任務最多幾則訊息 (任務本身 + 搜尋 + 整理)；單一代理人的子任務只需任務 + 回覆
+SUBTASK_MAX_MESSAGES = 3
+
+
+def _message_record(event) -> dict:
+    return {
+        "source": event.source,
+        "content": event.content,
+        "type": event.type,
+        "prompt_tokens": event.models_usage.prompt_tokens if event.models_usage else None,
+        "completion_tokens": event.models_usage.completion_tokens if event.models_usage else None
+    }
+
+
+async def _run_team(label: str, team, task: str, timeout_seconds: float = None, telemetry: Telemetry = None,
+                    on_message=None, stops: list = None) -> list:
+    """
+    執行一個 team 並收集文字訊息；label 用於輸出與 telemetry 區分，on_message 會收到每則訊息 (用於顯示進度)。
+    有傳入 stops 時附加一筆 {"label", "stop_reason", "timed_out", "replies"}，讓呼叫端判斷結果是否完整。
+    """
+    messages = []
+    run = BudgetedRun(team, task, timeout_seconds=timeout_seconds)
+    # 有傳入 telemetry 時記錄每則訊息的耗時與 token
+    stream = run if telemetry is None else telemetry.track(run, label)
+    async for event in stream:
+        if isinstance(event, TextMessage):
+            # 印出目前哪個 agent 正在運作，方便追蹤
+            print(f"[{event.source}] => {event.content}\n")
+            messages.append(_message_record(event))
+            if on_message is not None:
+                on_message(label, messages[-1])
+    print(f"[{label}] 分析結束原因：{run.stop_reason}（{run.elapsed:.1f} 秒）")
+    if stops is not None:
+        stops.append({
+            "label": label,
+            "stop_reason": run.stop_reason,
+            "timed_out": run.timed_out,
+            "replies": sum(1 for m in messages if m["source"] != "user"),
+        })
+    return messages
+
 
-termination_condition = TextMentionTermination("exit")
+def _subtask_termination(max_messages: int = SUBTASK_MAX_MESSAGES):
+    # 終止條件帶有狀態，每個子任務各建一份
+    return build_termination(budget["max_turns"], budget["max_tokens"]) | MaxMessageTermination(max_messages)
 
-async def analyze_stock(ticker: str, indicators: dict, model_client, termination_condition) -> dict:
+
+async def analyze_stock(ticker: str, indicators: dict, model_client, termination_condition,
+                        headless: bool = budget["headless"], timeout_seconds: float = budget["timeout_seconds"],
+                        telemetry: Telemetry = None, parallel: bool = True, on_message=None, stops: list = None) -> list:
+    """
+    產生投資研究報告的代理人訊息；stops (list) 會收到每個 team 的終止原因 (見 _run_team)。
+    parallel=True (預設)：公司 / 產業研究、財務分析、新聞蒐集三個子任務同時進行 (fan-out)，
+    再由 strategy_advisor 彙整 (fan-in)，總耗時約等於最慢的子任務；不使用 user_proxy。
+    parallel=False：原本的 RoundRobinGroupChat，所有代理人輪流發言。
+    """
     formatted_indicators = "\n".join([f"- {k}: {v}" for k, v in indicators.items()])
+    if not parallel:
+        return await _analyze_round_robin(ticker, formatted_indicators, model_client, termination_condition,
+                                          headless, timeout_seconds, telemetry, on_message, stops)
+
+    company_task = f"""
+    請搜尋外部網站，蒐集股票代碼 {ticker} 的公司基本資訊，包括其公司介紹、主要產品、主要客戶與合作夥伴，
+    以及其產業介紹，包括公司所屬產業、競爭對手等等。請使用繁體中文整理搜尋結果。
+    """
+    financial_task = f"""
+    請根據以下 {ticker} 的財務與技術指標：
+    {formatted_indicators}
+    深入說明該公司的財務狀況，具體分析該公司財務狀況，包括財務比率、營收變化、成本結構、獲利能力等等
+    此段以段落文字提出，摘要其財務優勢，300字左右即可，請使用繁體中文。
+    """
+    news_task = f"""
+    請搜尋並彙整過去三至六個月內與股票代碼 {ticker} 相關的重要新聞 3-5 則，
+    內容可以包含業務擴張或收縮、產品更新、跨國合作、政策變動影響（如監管、新稅制、補助等）、宏觀經濟與地緣政治因素對公司之潛在影響等等。
+    請使用繁體中文，以「新聞標題：摘要說明」條列。
+    """
+
+    # fan-out：每個子任務各自的代理人 (網頁搜尋各開一個瀏覽器)
+    company_researcher = MultimodalWebSurfer("company_researcher", model_client)
+    news_analyst = MultimodalWebSurfer("news_analyst", model_client)
+    company_team = RoundRobinGroupChat(
+        [company_researcher, AssistantAgent("company_writer", model_client)],
+        termination_condition=_subtask_termination()
+    )
+    financial_team = RoundRobinGroupChat(
+        [AssistantAgent("financial_analyst", model_client)],
+        termination_condition=_subtask_termination(2)
+    )
+    news_team = RoundRobinGroupChat(
+        [news_analyst, AssistantAgent("news_writer", model_client)],
+        termination_condition=_subtask_termination()
+    )
+    try:
+        company, financial, news = await asyncio.gather(
+            _run_team(f"{ticker}:company", company_team, company_task, timeout_seconds, telemetry, on_message, stops),
+            _run_team(f"{ticker}:financial", financial_team, financial_task, timeout_seconds, telemetry, on_message, stops),
+            _run_team(f"{ticker}:news", news_team, news_task, timeout_seconds, telemetry, on_message, stops),
+        )
+    finally:
+        # 搜尋結束 (或失敗) 後關閉瀏覽器，整合階段用不到
+        await asyncio.gather(company_researcher.close(), news_analyst.close())
+
+    # fan-in：strategy_advisor 只看各子任務的最後結論
+    def _last_reply(messages):
+        replies = [m["content"] for m in messages if m["source"] != "user"]
+        return replies[-1] if replies else "（無資料）"
+
+    merge_task = f"""
+    以下是針對股票代碼 {ticker} 平行完成的三份研究結果，請整合成一份完整且具深度的投資研究分析報告，
+    包含公司介紹、產業介紹、財務概況、近期新聞整理，並提出「買進」、「持有」或「賣出」的投資建議與理由。
+    請使用繁體中文，並避免產出重複內容。
+
+    請只輸出一個 JSON 物件 (不要加任何說明文字)，格式如下，每個欄位都是字串陣列：
+    {SECTION_SCHEMA}
+
+    [公司與產業研究]
+    {_last_reply(company)}
+
+    [財務分析]
+    {_last_reply(financial)}
+
+    [近期新聞]
+    {_last_reply(news)}
+    """
+    strategy_team = RoundRobinGroupChat(
+        [AssistantAgent("strategy_advisor", model_client)],
+        termination_condition=termination_condition | MaxMessageTermination(2)
+    )
+    strategy = await _run_team(f"{ticker}:strategy", strategy_team, merge_task, timeout_seconds, telemetry, on_message,
+                               stops)
+
+    # 只保留代理人的回覆，子任務的指令不放進報告素材
+    return [m for m in company + financial + news + strategy if m["source"] != "user"]
+
 
-    # 建立代理人群組
-    user_proxy = UserProxyAgent("user_proxy")
+async def _analyze_round_robin(ticker: str, formatted_indicators: str, model_client, termination_condition,
+                               headless: bool, timeout_seconds: float, telemetry: Telemetry, on_message=None,
+                               stops: list = None) -> list:
+    # 建立代理人群組 (headless 時不加入會等待輸入的 user_proxy)
     financial_analyst = AssistantAgent("financial_analyst", model_client)
     news_analyst = MultimodalWebSurfer("news_analyst", model_client)
     strategy_advisor = AssistantAgent("strategy_advisor", model_client)
+    participants = [financial_analyst, news_analyst, strategy_advisor]
+    if not headless:
+        participants.insert(0, UserProxyAgent("user_proxy"))
+
+    if headless:
+        # 沒有 user_proxy 就沒有人會輸入 exit，即使 .env 沒設定 AGENT_MAX_TURNS 也要有訊息數上限
+        termination_condition = termination_condition | MaxMessageTermination(DEFAULT_HEADLESS_MAX_TURNS)
 
     team = RoundRobinGroupChat(
-        [user_proxy, financial_analyst, news_analyst, strategy_advisor],
+        participants,
         termination_condition=termination_condition
     )
 
@@ -58,30 +221,21 @@ async def analyze_stock(ticker: str, indicators: dict, model_client, termination
     請所有代理人務必回傳整體報告內容，請使用繁體中文，並避免產出重複內容。
     """
 
-    # 收集所有回覆
-    messages = []
-    async for event in team.run_stream(task=prompt):
-        if isinstance(event, TextMessage):
-            # 印出目前哪個 agent 正在運作，方便追蹤
-            print(f"[{event.source}] => {event.content}\n")
-            messages.append({
-                "source": event.source,
-                "content": event.content,
-                "type": event.type,
-                "prompt_tokens": event.models_usage.prompt_tokens if event.models_usage else None,
-                "completion_tokens": event.models_usage.completion_tokens if event.models_usage else None
-            })
-    return messages
-
+    # 收集所有回覆，結束後關閉 news_analyst 開的瀏覽器
+    try:
+        return await _run_team(ticker, team, prompt, timeout_seconds, telemetry, on_message, stops)
+    finally:
+        await news_analyst.close()
 
-async def summarize_with_gemini(messages: list) -> pd.DataFrame:
-    api_key = os.getenv('GEMINI_API_KEY')
 
-    # 呼叫 gemini 2.0 模型生成內容
-    model_client = OpenAIChatCompletionClient(
-        model="gemini-2.0-flash",
-        api_key=api_key,
-    )
+async def summarize_with_gemini(messages: list, model_client=None) -> pd.DataFrame:
+    # 呼叫 gemini 2.0 模型生成內容 (批次執行時傳入共用的 model_client)
+    # 設定 MODEL_REPLAY_MODE 時改用錄製 / 重播用戶端，可離線重跑
+    if model_client is None:
+        model_client = wrap_from_env(OpenAIChatCompletionClient(
+            model="gemini-2.0-flash",
+            api_key=os.getenv('GEMINI_API_KEY'),
+        ))
 
     # 將所有 message 合併成文字
     full_text = "\n".join([msg["content"] for msg in messages if "content" in msg])
@@ -161,16 +315,64 @@ async def summarize_with_gemini(messages: list) -> pd.DataFrame:
 
 
     # 整理成 DataFrame
-    max_len = max(len(financial_summary), len(news_collection), len(investing_suggestion))
-    data = {
-        "company": company_introduction + [""] * (max_len - len(company_introduction)),
-        "industry": industry_introduction + [""] * (max_len - len(industry_introduction)),
-        "financial": financial_summary + [""] * (max_len - len(financial_summary)),
-        "news": news_collection + [""] * (max_len - len(news_collection)),
-        "suggestion": investing_suggestion + [""] * (max_len - len(investing_suggestion)),
-    }
-
-    df = pd.DataFrame(data)
+    df = sections_to_frame({
+        "company": company_introduction,
+        "industry": industry_introduction,
+        "financial": financial_summary,
+        "news": news_collection,
+        "suggestion": investing_suggestion,
+    })
     print(df)
     
-    return df
\ No newline at end of file
+    return df
+
+
+def sections_to_frame(sections: dict) -> pd.DataFrame:
+    """五個段落 (list of str) 補齊成同樣長度的 DataFrame，欄位順序同 SECTION_KEYS。"""
+    max_len = max(len(sections[key]) for key in SECTION_KEYS)
+    return pd.DataFrame({key: sections[key] + [""] * (max_len - len(sections[key])) for key in SECTION_KEYS})
+
+
+def parse_sections(text: str):
+    """
+    解析代理人輸出的 JSON 段落並檢查格式：
+    五個欄位都要有，值為字串陣列 (單一字串會依換行拆開)，且至少有財務概況與投資建議。
+    不符合時回傳 None。
+    """
+    cleaned = text.strip()
+    # 去掉 markdown 的 ```json 標記，只取最外層的 {...}
+    start, end = cleaned.find("{"), cleaned.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        data = json.loads(cleaned[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(data, dict) or any(key not in data for key in SECTION_KEYS):
+        return None
+
+    sections = {}
+    for key in SECTION_KEYS:
+        value = data[key]
+        if isinstance(value, str):
+            value = value.splitlines()
+        if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+            return None
+        sections[key] = [item.strip().lstrip("-• ").strip() for item in value if item.strip()]
+    if not sections["financial"] or not sections["suggestion"]:
+        return None
+    return sections
+
+
+async def build_report_frame(messages: list, model_client=None) -> pd.DataFrame:
+    """
+    取得報告用的五段 DataFrame：
+    strategy_advisor 已輸出合格的 JSON 時直接使用，不需再呼叫模型；
+    否則 (例如 parallel=False 或格式錯誤) 才退回 summarize_with_gemini 重新整理整段對話。
+    """
+    replies = [m for m in messages if m.get("source") == "strategy_advisor"]
+    sections = parse_sections(replies[-1]["content"]) if replies else None
+    if sections is not None:
+        return sections_to_frame(sections)
+    print("⚠️ 代理人輸出不是合格的 JSON 段落，改用 summarize_with_gemini 整理")
+    return await summarize_with_gemini(messages, model_client=model_client)
\ No newline at end of file
@@ -0,0 +1,63 @@
+import os
+import time
+import datetime
+from utils.cache import TTLCache
+from utils.agent import SECTION_KEYS, analyze_stock, budget, build_report_frame, build_termination, model_client
+
+# prompt 或輸出格式改變時調整版本，舊的分析結果自然失效
+PROMPT_VERSION = "v2"
+
+# 同一天內的分析結果保留多久 (小時)，可由 .env 的 ANALYSIS_CACHE_HOURS 調整
+ANALYSIS_CACHE_HOURS = float(os.getenv("ANALYSIS_CACHE_HOURS", "12"))
+
+analysis_cache = TTLCache("analysis", ANALYSIS_CACHE_HOURS * 3600)
+
+
+def analysis_key(ticker: str, date: datetime.date = None) -> str:
+    """快取鍵：股票代碼 + 日期 + prompt 版本 (隔天或改版就會重新分析)。"""
+    date = date or datetime.date.today()
+    return f"{ticker.upper()}:{date.isoformat()}:{PROMPT_VERSION}"
+
+
+async def _run_analysis(ticker: str, indicators: dict, client, condition, **kwargs) -> dict:
+    stops = []
+    messages = await analyze_stock(ticker, indicators, client, condition, stops=stops, **kwargs)
+    df = await build_report_frame(messages, model_client=client)
+    # 完整：沒有任何 team 逾時或沒有回覆 (fan-in 時會變成「（無資料）」)，且五個段落都有內容
+    complete = (
+        all(not stop["timed_out"] and stop["replies"] for stop in stops)
+        and all(any(str(item).strip() for item in df[key]) for key in SECTION_KEYS)
+    )
+    return {"messages": messages, "df": df, "indicators": indicators, "created_at": time.time(), "complete": complete}
+
+
+async def cached_analysis_async(ticker: str, indicators: dict, client, condition,
+                                force_refresh: bool = False, **kwargs) -> dict:
+    """
+    回傳 {"messages", "df", "indicators", "created_at", "complete"}：
+    同一檔股票同一天 (且未超過 ANALYSIS_CACHE_HOURS) 直接回傳上次的結果，force_refresh=True 時重新分析。
+    不完整的結果 (逾時、子任務沒有回覆或有段落是空的) 照常回傳但不寫入快取，下次會重新分析。
+    """
+    key = analysis_key(ticker)
+    if not force_refresh:
+        cached = analysis_cache.get(key)
+        if cached is not None:
+            return cached
+    result = await _run_analysis(ticker.upper(), indicators, client, condition, **kwargs)
+    if result["complete"]:
+        analysis_cache.set(key, result)
+    return result
+
+
+async def analysis_job(job, ticker: str, indicators: dict, force_refresh: bool = False) -> dict:
+    """給 job_manager 執行的分析工作，每則代理人訊息即時回報到 job。"""
+    job.update("代理人分析中")
+    # 終止條件帶有狀態，同一個 loop 上可能有多個分析同時進行，每個工作各建一份
+    return await cached_analysis_async(
+        ticker,
+        indicators,
+        model_client,
+        build_termination(budget["max_turns"], budget["max_tokens"]),
+        force_refresh=force_refresh,
+        on_message=job.add_message,
+    )
@@ -0,0 +1,132 @@
+import os
+import time
+import pickle
+import hashlib
+import threading
+from concurrent.futures import Future
+
+# 快取檔案放在 Final_Project/cache/
+CACHE_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache")
+
+
+class TTLCache:
+    """
+    整個行程共用、並保存到磁碟的 TTL 快取：
+      - 先查記憶體，再查磁碟 (pickle)，超過 ttl 秒視為過期，過期的項目在 get / set 時清掉
+      - lock 只保護記憶體中的 dict；讀寫 pickle 檔都在 lock 外進行，不會讓其他 key 等待磁碟 I/O
+      - 請求合併：多個 Streamlit session (不同 thread) 同時要同一個 key 時，
+        只有第一個真的去抓資料，其他人等待同一個結果
+    """
+
+    def __init__(self, name: str, ttl: float, cache_dir: str = CACHE_ROOT):
+        self.ttl = ttl
+        self.cache_dir = os.path.join(cache_dir, name)
+        self._memory = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".pkl")
+
+    def _fresh(self, entry) -> bool:
+        return entry is not None and time.time() - entry[0] < self.ttl
+
+    def _memory_entry(self, key: str):
+        """呼叫端需持有 self._lock；過期的項目直接從記憶體移除。"""
+        entry = self._memory.get(key)
+        if entry is not None and not self._fresh(entry):
+            del self._memory[key]
+            return None
+        return entry
+
+    def _prune(self) -> None:
+        """呼叫端需持有 self._lock；移除記憶體中所有過期的項目。"""
+        for key in [key for key, entry in self._memory.items() if not self._fresh(entry)]:
+            del self._memory[key]
+
+    def _read_disk(self, key: str):
+        """在 lock 外讀取磁碟上的項目；不存在、讀取失敗或過期時回傳 None (過期的檔案順便刪除)。"""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        if not self._fresh(entry):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return entry
+
+    def _remember(self, key: str, entry) -> None:
+        """從磁碟讀到的項目放回記憶體；讀檔期間若已有較新的 set()，保留較新的。"""
+        with self._lock:
+            current = self._memory.get(key)
+            if current is None or current[0] < entry[0]:
+                self._memory[key] = entry
+
+    def _lookup(self, key: str):
+        with self._lock:
+            entry = self._memory_entry(key)
+        if entry is None:
+            entry = self._read_disk(key)
+            if entry is not None:
+                self._remember(key, entry)
+        return entry
+
+    def get_or_fetch(self, key: str, fetch):
+        with self._lock:
+            entry = self._memory_entry(key)
+            if entry is not None:
+                return entry[1]
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+
+        if not owner:
+            return future.result()
+
+        try:
+            entry = self._read_disk(key)
+            if entry is not None:
+                self._remember(key, entry)
+                value = entry[1]
+            else:
+                value = fetch()
+                self.set(key, value)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def get(self, key: str):
+        """未過期時回傳快取值，否則回傳 None。"""
+        entry = self._lookup(key)
+        return entry[1] if entry is not None else None
+
+    def set(self, key: str, value) -> None:
+        entry = (time.time(), value)
+        with self._lock:
+            self._prune()
+            self._memory[key] = entry
+        tmp_path = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(entry, f)
+        os.replace(tmp_path, self._path(key))
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._memory.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
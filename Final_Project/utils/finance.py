@@ -1,12 +1,29 @@
+import os
+import sys
 import yfinance as yf
 import plotly.graph_objs as go
 import datetime
+from utils.cache import TTLCache
+from utils.price_store import price_store
+
+# 共用工具放在專案根目錄的 common/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from common.indicators import indicator_cache
+
+# 基本面資料變動慢，設定較長的 TTL (秒)；股價由 price_store 增量更新
+INFO_TTL = 6 * 3600
+
+info_cache = TTLCache("yf_info", INFO_TTL)
+
+# 圖上畫 20 / 60 日均線；往前多取的 K 棒數 (約一年) 讓 EMA、RSI 等指標收斂
+INDICATOR_PARAMS = {"sma": (20, 60)}
+WARMUP_BARS = 252
 
 def fetch_stock_data(ticker: str, days: int = 180):
     stock = yf.Ticker(ticker)
 
-    # 公司基本資訊
-    info = stock.info
+    # 公司基本資訊 (多個使用者同時查詢同一檔股票時只會抓一次)
+    info = info_cache.get_or_fetch(ticker, lambda: stock.info)
     name = info.get("longName", "N/A")
 
     indicators = {
@@ -20,20 +37,30 @@ def fetch_stock_data(ticker: str, days: int = 180):
         "52週最低價": info.get("fiftyTwoWeekLow", "N/A")
     }
 
-    # 時間範圍
+    # 時間範圍：從本地價格庫取出最近 days 天，並往前多取一年的 K 棒讓均線 / EMA 類指標暖機
     end = datetime.datetime.today()
-    start = end - datetime.timedelta(days=days + 300)
-    hist = stock.history(start=start, end=end)
+    # K 棒的時間是當天 00:00，起點取到日期為止，否則 start 當天的 K 棒會被切掉
+    start = datetime.datetime.combine(end.date() - datetime.timedelta(days=days), datetime.time.min)
+    hist = price_store.window(ticker, start=start, end=end, warmup=WARMUP_BARS)
 
-    # 移動平均線
-    hist["MA20"] = hist["Close"].rolling(window=20).mean()
-    hist["MA60"] = hist["Close"].rolling(window=60).mean()
+    # 技術指標 (同一檔股票、同一段資料只算一次)
+    hist = indicator_cache.get_or_compute(ticker, hist, INDICATOR_PARAMS)
+    last = hist.iloc[-1]
+    indicators.update({
+        "RSI (14)": round(last["RSI"], 2),
+        "MACD (12, 26, 9)": f"{last['MACD']:.2f} / 訊號線 {last['MACD_signal']:.2f}",
+        "布林通道 (20, 2)": f"{last['BB_lower']:.2f} – {last['BB_upper']:.2f}",
+        "ATR (14)": round(last["ATR"], 2),
+        "年化波動率 (20日)": f"{last['Volatility']:.2%}",
+        "距近期高點回撤": f"{last['Drawdown']:.2%}",
+    })
+    hist = hist.loc[start:]
 
     # 畫圖
     fig = go.Figure()
     fig.add_trace(go.Scatter(x=hist.index, y=hist["Close"], name="收盤價", line=dict(color="blue")))
-    fig.add_trace(go.Scatter(x=hist.index, y=hist["MA20"], name="20日均線", line=dict(color="orange")))
-    fig.add_trace(go.Scatter(x=hist.index, y=hist["MA60"], name="60日均線", line=dict(color="green")))
+    fig.add_trace(go.Scatter(x=hist.index, y=hist["SMA20"], name="20日均線", line=dict(color="orange")))
+    fig.add_trace(go.Scatter(x=hist.index, y=hist["SMA60"], name="60日均線", line=dict(color="green")))
     fig.update_layout(title=f"{ticker} 過去股價走勢", xaxis_title="日期", yaxis_title="價格", template="plotly_white")
 
     return {
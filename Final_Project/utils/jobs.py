@@ -0,0 +1,112 @@
+import time
+import uuid
+import asyncio
+import threading
+
+
+class Job:
+    """一個背景工作的狀態；頁面每次 rerun 讀取 snapshot() 顯示進度與目前為止的代理人訊息。"""
+
+    def __init__(self, job_id: str, label: str):
+        self.id = job_id
+        self.label = label
+        self.state = "pending"
+        self.progress = "排隊中"
+        self.messages = []
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.future = None
+
+    @property
+    def done(self) -> bool:
+        return self.state in ("done", "failed", "cancelled")
+
+    def update(self, progress: str) -> None:
+        self.progress = progress
+
+    def add_message(self, label: str, message: dict) -> None:
+        self.messages.append({"step": label, **message})
+        self.progress = f"{message['source']} 已回覆 ({len(self.messages)} 則訊息)"
+
+    def snapshot(self) -> dict:
+        return {
+            "id": self.id,
+            "label": self.label,
+            "state": self.state,
+            "progress": self.progress,
+            "messages": list(self.messages),
+            "result": self.result,
+            "error": self.error,
+            "elapsed": (self.finished_at or time.time()) - self.created_at,
+        }
+
+
+class JobManager:
+    """
+    整個行程共用一個背景 event loop (daemon thread)：
+      - submit() 把 async 工作丟到背景 loop，立即回傳 job id，頁面不必等待
+      - 所有 session 的工作在同一個 loop 上重疊執行，model client 也只綁定這個 loop
+      - 相同 key 的工作還在跑時直接回傳同一個 job id (多人同時查同一檔股票只跑一次)
+      - 完成超過 keep_seconds 的工作會被清掉
+    """
+
+    def __init__(self, keep_seconds: float = 3600):
+        self.keep_seconds = keep_seconds
+        self.loop = asyncio.new_event_loop()
+        self._jobs = {}
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="job-loop", daemon=True)
+        self._thread.start()
+
+    def _cleanup(self) -> None:
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.done and now - job.finished_at > self.keep_seconds:
+                del self._jobs[job_id]
+
+    async def _run(self, job: Job, fn, args, kwargs) -> None:
+        job.state = "running"
+        job.progress = "執行中"
+        try:
+            job.result = await fn(job, *args, **kwargs)
+            job.state = "done"
+            job.progress = "完成"
+        except asyncio.CancelledError:
+            job.state = "cancelled"
+            job.progress = "已取消"
+        except Exception as e:
+            job.state = "failed"
+            job.error = f"{type(e).__name__}: {e}"
+            job.progress = "失敗"
+        finally:
+            job.finished_at = time.time()
+
+    def submit(self, fn, *args, key: str = None, label: str = "", **kwargs) -> str:
+        """fn(job, *args, **kwargs) 為 async 函式，可呼叫 job.update() / job.add_message() 回報進度。"""
+        with self._lock:
+            if key is not None and key in self._active:
+                running = self._jobs.get(self._active[key])
+                if running is not None and not running.done:
+                    return running.id
+            self._cleanup()
+            job = Job(uuid.uuid4().hex[:12], label or key or fn.__name__)
+            self._jobs[job.id] = job
+            if key is not None:
+                self._active[key] = job.id
+        job.future = asyncio.run_coroutine_threadsafe(self._run(job, fn, args, kwargs), self.loop)
+        return job.id
+
+    def get(self, job_id: str):
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> None:
+        job = self._jobs.get(job_id)
+        if job is not None and job.future is not None:
+            job.future.cancel()
+
+
+# 整個行程共用一個 job manager (Streamlit rerun 不會重新建立模組層級的物件)
+job_manager = JobManager()
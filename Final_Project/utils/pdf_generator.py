@@ -1,9 +1,30 @@
 import os
+import sys
+import glob
+import json
+import hashlib
+import tempfile
 import textwrap
+import threading
+from functools import lru_cache
+from collections import OrderedDict
 from fpdf import FPDF
 from datetime import datetime
-from tempfile import NamedTemporaryFile
 
+# 共用工具放在專案根目錄的 common/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from common.chart_renderer import chart_renderer
+
+OUTPUT_DIR = "output"
+# output/ 與記憶體中最多保留幾份報告，超過時刪掉最久沒用到的
+MAX_REPORTS = 20
+
+_report_bytes = OrderedDict()
+# _report_lock 只保護 _report_bytes / _report_locks 的查詢與寫入；產生 PDF 時持有的是該報告自己的 lock
+_report_lock = threading.Lock()
+_report_locks = {}
+
+@lru_cache(maxsize=None)
 def find_chinese_font():
     # 優先使用本地相對路徑的字體
     local_font_path = "./fonts/Arial Unicode.ttf"
@@ -54,11 +75,22 @@ class PDFReport(FPDF):
         self.multi_cell(0, 8, text)
         self.ln(5)
 
-    def insert_image(self, image_path, width=180):
-        self.image(image_path, w=width)
+    def insert_image(self, image, width=180):
+        # image 可以是檔案路徑或 PNG 的 bytes；fpdf 1.7.2 只收檔名，bytes 先寫到暫存檔
+        if not isinstance(image, bytes):
+            self.image(image, w=width)
+            self.ln(5)
+            return
+        # delete=False：Windows 上檔案開著時 fpdf 無法再開啟，所以關閉後自己刪除
+        with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
+            tmp.write(image)
+        try:
+            self.image(tmp.name, w=width)
+        finally:
+            os.remove(tmp.name)
         self.ln(5)
 
-def generate_pdf_report(df, user_inputs, indicators_dict, figure):
+def generate_pdf_report(df, user_inputs, indicators_dict, figure, filename=None):
     font_path = find_chinese_font()
     if not font_path:
         raise FileNotFoundError("❌ 找不到中文字型檔案，請確認字體已安裝或路徑正確")
@@ -79,11 +111,8 @@ def generate_pdf_report(df, user_inputs, indicators_dict, figure):
         wrapped_text = wrap_text(text)
         pdf.multi_cell(0, 8, wrapped_text)
 
-    # 插入圖表圖片
-    with NamedTemporaryFile(delete=False, suffix=".png") as tmpfile:
-        figure.write_image(tmpfile.name)
-        pdf.insert_image(tmpfile.name)
-        os.unlink(tmpfile.name)
+    # 插入圖表圖片 (常駐的 renderer 直接輸出 PNG bytes)
+    pdf.insert_image(chart_renderer.render(figure))
 
     # 分析報告區塊
     section_titles = [
@@ -99,9 +128,66 @@ def generate_pdf_report(df, user_inputs, indicators_dict, figure):
             pdf.add_text(section, column_data)
 
     # 儲存
-    if not os.path.exists("output"):
-        os.makedirs("output")
-    filename = f"output/report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+    if filename is None:
+        filename = os.path.join(OUTPUT_DIR, f"report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf")
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
     pdf.output(filename)
 
-    return filename
\ No newline at end of file
+    return filename
+
+def report_key(df, user_inputs, indicators_dict, figure):
+    """分析結果 (表格、輸入、指標、圖表) 的雜湊值，內容相同的報告只需產生一次。"""
+    payload = json.dumps([
+        df.to_json(orient="split", force_ascii=False),
+        user_inputs,
+        {k: str(v) for k, v in indicators_dict.items()},
+        figure.to_json(),
+    ], ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _evict_old_reports(output_dir, max_reports):
+    reports = sorted(glob.glob(os.path.join(output_dir, "report_*.pdf")), key=os.path.getmtime)
+    for path in reports[:-max_reports]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def cached_pdf_report(df, user_inputs, indicators_dict, figure, key=None, output_dir=OUTPUT_DIR, max_reports=MAX_REPORTS):
+    """
+    依分析結果的雜湊值快取 PDF，回傳檔案內容 (bytes)：
+      - 先查記憶體，再查 output/report_<hash>.pdf，都沒有才真的產生
+      - Streamlit 每次 rerun 呼叫也不會重畫圖、重寫檔
+      - output/ 只保留最近用到的 max_reports 份，舊檔自動刪除
+    """
+    key = key or report_key(df, user_inputs, indicators_dict, figure)
+    with _report_lock:
+        if key in _report_bytes:
+            _report_bytes.move_to_end(key)
+            return _report_bytes[key]
+        key_lock = _report_locks.setdefault(key, threading.Lock())
+
+    # 同一份報告只讓一個執行緒產生，不同報告可以同時產生
+    with key_lock:
+        with _report_lock:
+            # 等待期間其他執行緒可能已經產生好了
+            if key in _report_bytes:
+                _report_bytes.move_to_end(key)
+                return _report_bytes[key]
+
+        path = os.path.join(output_dir, f"report_{key[:16]}.pdf")
+        if os.path.exists(path):
+            os.utime(path)
+        else:
+            generate_pdf_report(df, user_inputs, indicators_dict, figure, filename=path)
+            _evict_old_reports(output_dir, max_reports)
+        with open(path, "rb") as f:
+            data = f.read()
+
+        with _report_lock:
+            _report_bytes[key] = data
+            while len(_report_bytes) > max_reports:
+                _report_bytes.popitem(last=False)
+            # 之後的呼叫會直接命中 _report_bytes，不再需要這把 lock
+            _report_locks.pop(key, None)
+        return data
@@ -0,0 +1,147 @@
+import os
+import time
+import threading
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from utils.cache import CACHE_ROOT
+
+COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+CLOSE = COLUMNS.index("Close")
+# 日期與 OHLCV 存在同一個檔案 (structured array)，一次寫入就不會讀到新舊混在一起的兩個陣列
+RECORD = np.dtype([("date", "datetime64[ns]"), ("ohlcv", "f8", (len(COLUMNS),))])
+
+
+class PriceStore:
+    """
+    每檔股票一份完整歷史的 OHLCV 本地資料庫：
+      - 以 .npy 保存 (structured array：date datetime64[ns] + ohlcv 5 個 float64)，讀取時使用 memory map
+      - 每次更新寫成新的版本檔 (<time_ns>.npy)，讀取時取最新版本；不覆蓋舊檔，
+        其他執行緒 / 行程的 memory map 不受影響 (Windows 上也不會因為檔案被 map 而無法取代)
+      - 第一次使用時抓取全部歷史，之後只抓最後幾根 K 棒以後的資料並附加
+        (最後一根會重抓，盤中的未收盤資料會被覆蓋)
+      - yfinance 的價格是還原後的，除權息或分割後整段歷史都會改變；
+        重疊的已收盤 K 棒收盤價不同時重抓全部歷史，避免新舊還原基準混在一起
+      - 同一檔股票在 refresh_interval 秒內不會重複連網檢查
+      - window() 以 searchsorted 找出區間，回傳建立在 memory map 上的 DataFrame
+    """
+
+    def __init__(self, root: str = os.path.join(CACHE_ROOT, "prices"), refresh_interval: float = 15 * 60):
+        self.root = root
+        self.refresh_interval = refresh_interval
+        self._arrays = {}
+        self._checked_at = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _ticker_lock(self, ticker: str) -> threading.RLock:
+        # update() 持有 lock 時會呼叫 _load()，所以用可重入的 RLock
+        with self._lock:
+            return self._locks.setdefault(ticker, threading.RLock())
+
+    def _folder(self, ticker: str) -> str:
+        return os.path.join(self.root, ticker.upper())
+
+    def _versions(self, ticker: str) -> list:
+        try:
+            names = os.listdir(self._folder(ticker))
+        except FileNotFoundError:
+            return []
+        return sorted(name for name in names if name.endswith(".npy") and name[:-4].isdigit())
+
+    def _load(self, ticker: str):
+        with self._ticker_lock(ticker):
+            if ticker not in self._arrays:
+                for attempt in range(3):
+                    versions = self._versions(ticker)
+                    if not versions:
+                        return None
+                    try:
+                        records = np.load(os.path.join(self._folder(ticker), versions[-1]), mmap_mode="r")
+                        break
+                    except FileNotFoundError:
+                        # 其他行程剛寫好新版本並刪掉舊檔，重新列出版本
+                        if attempt == 2:
+                            raise
+                self._arrays[ticker] = (records["date"], records["ohlcv"])
+            return self._arrays[ticker]
+
+    def _write(self, ticker: str, dates: np.ndarray, ohlcv: np.ndarray) -> None:
+        folder = self._folder(ticker)
+        os.makedirs(folder, exist_ok=True)
+        records = np.empty(len(dates), dtype=RECORD)
+        records["date"] = dates
+        records["ohlcv"] = ohlcv
+        # 先寫暫存檔再改名成新的版本檔，讀取端不會看到寫到一半的檔案
+        name = f"{time.time_ns():020d}.npy"
+        tmp_path = os.path.join(folder, f"{name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, records)
+        os.replace(tmp_path, os.path.join(folder, name))
+        self._arrays.pop(ticker, None)
+        for old in self._versions(ticker)[:-1]:
+            try:
+                os.remove(os.path.join(folder, old))
+            except OSError:
+                # Windows 上仍被 memory map 的舊版本刪不掉，下次更新時再刪
+                pass
+
+    @staticmethod
+    def _download(ticker: str, start=None) -> pd.DataFrame:
+        stock = yf.Ticker(ticker)
+        hist = stock.history(start=start) if start is not None else stock.history(period="max")
+        if hist.empty:
+            return hist
+        hist.index = hist.index.tz_localize(None).normalize() if hist.index.tz is not None else hist.index.normalize()
+        return hist[COLUMNS]
+
+    def _write_history(self, ticker: str, hist: pd.DataFrame) -> None:
+        if hist.empty:
+            raise ValueError(f"查無 {ticker} 的股價資料")
+        self._write(ticker, hist.index.to_numpy(dtype="datetime64[ns]"), hist.to_numpy(dtype=float))
+
+    def update(self, ticker: str) -> None:
+        """補齊 ticker 的最新資料 (沒有本地資料或還原基準改變時下載全部歷史)。"""
+        ticker = ticker.upper()
+        with self._ticker_lock(ticker):
+            if time.time() - self._checked_at.get(ticker, 0) < self.refresh_interval:
+                return
+            stored = self._load(ticker)
+            if stored is None:
+                self._write_history(ticker, self._download(ticker))
+            else:
+                dates, ohlcv = stored
+                # 從倒數第二根開始抓：最後一根可能是盤中資料，倒數第二根已收盤，用來比對還原基準
+                anchor = max(len(dates) - 2, 0)
+                anchor_date = pd.Timestamp(dates[anchor])
+                new = self._download(ticker, start=anchor_date)
+                if not new.empty:
+                    if anchor_date not in new.index or not np.isclose(
+                            new.at[anchor_date, "Close"], ohlcv[anchor, CLOSE], rtol=1e-6):
+                        # 除權息 / 分割後舊資料的還原價格已經不同，整段重抓
+                        self._write_history(ticker, self._download(ticker))
+                    else:
+                        keep = dates < new.index[0].to_datetime64()
+                        merged_dates = np.concatenate([dates[keep], new.index.to_numpy(dtype="datetime64[ns]")])
+                        merged_ohlcv = np.concatenate([ohlcv[keep], new.to_numpy(dtype=float)])
+                        self._write(ticker, merged_dates, merged_ohlcv)
+            self._checked_at[ticker] = time.time()
+
+    def window(self, ticker: str, start=None, end=None, warmup: int = 0, refresh: bool = True) -> pd.DataFrame:
+        """
+        取出 [start, end] 區間的 OHLCV；warmup 會在 start 之前多保留幾根 K 棒
+        (例如計算 60 日均線時 warmup=59)，不需要為了均線多下載資料。
+        """
+        ticker = ticker.upper()
+        if refresh:
+            self.update(ticker)
+        dates, ohlcv = self._load(ticker)
+        lo = 0 if start is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(start)), side="left")
+        hi = len(dates) if end is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(end)), side="right")
+        lo = max(0, lo - warmup)
+        return pd.DataFrame(ohlcv[lo:hi], index=pd.DatetimeIndex(dates[lo:hi], name="Date"), columns=COLUMNS, copy=False)
+
+
+# 整個行程共用一個價格資料庫
+price_store = PriceStore()
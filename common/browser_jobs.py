@@ -0,0 +1,122 @@
+import os
+from dotenv import load_dotenv
+
+from common.browser_pool import BrowserJob, wait_visible
+
+# 讀取 .env 檔案 (帳號密碼)
+load_dotenv()
+
+
+class TodoistTaskJob(BrowserJob):
+    """在 Todoist 新增一個任務，可指定專案 (例如「長期追蹤清單」) 與優先級 (1–4)。"""
+
+    site = "todoist"
+    LOGIN_URL = "https://todoist.com/users/showlogin"
+    APP_URL = "https://app.todoist.com/app/today"
+
+    def __init__(self, task_name: str, project: str = None, priority: int = None,
+                 email: str = None, password: str = None):
+        self.task_name = task_name
+        self.project = project
+        self.priority = priority
+        self.email = email or os.getenv("TODOIST_EMAIL")
+        self.password = password or os.getenv("TODOIST_PASSWORD")
+
+    def _add_button(self, page):
+        return page.locator("button[aria-disabled='false'] span:has-text('添加任務')").first
+
+    async def is_logged_in(self, page) -> bool:
+        await page.goto(self.APP_URL)
+        return await wait_visible(self._add_button(page))
+
+    async def login(self, page) -> None:
+        await page.goto(self.LOGIN_URL)
+        await page.fill("input[id='element-0']", self.email)
+        await page.fill("input[id='element-2']", self.password)
+        await page.press("input[id='element-2']", "Enter")
+        await page.wait_for_url(lambda url: "showlogin" not in url, timeout=30000)
+        await page.goto(self.APP_URL)
+
+    async def run(self, page) -> str:
+        if self.project:
+            async with self.step("open_project", page):
+                await page.locator(f"span:has-text('{self.project}')").first.click()
+
+        async with self.step("fill_task", page):
+            await self._add_button(page).click()
+            task_name_input = page.locator("p[data-placeholder='任務名稱']").first
+            await self.wait(task_name_input, "task_name_input")
+            await task_name_input.fill(self.task_name)
+
+        if self.priority:
+            async with self.step("set_priority", page):
+                await page.locator("svg[data-priority='4']").first.click()
+                priority_option = page.locator(f"span.priority_picker_item_name:has-text('優先級{self.priority}')").first
+                await self.wait(priority_option, "priority_option")
+                await priority_option.click()
+
+        async with self.step("submit", page):
+            # 清單上可能已經有同名的任務，記下送出前的數量，等多出一筆才算新增成功
+            same_name = page.locator("li.task_list_item").filter(has=page.get_by_text(self.task_name, exact=True))
+            existing = await same_name.count()
+            await page.locator("button[data-testid='task-editor-submit-button']").first.click()
+            await self.wait(same_name.nth(existing), "task_in_list")
+        print(f"任務已創建：{self.task_name}")
+        return self.task_name
+
+    def __repr__(self) -> str:
+        return f"TodoistTaskJob({self.task_name!r})"
+
+
+class FacebookPostJob(BrowserJob):
+    """在自己的 Facebook 個人頁面發佈一則貼文。"""
+
+    site = "facebook"
+    HOME_URL = "https://www.facebook.com/"
+    PROFILE_URL = "https://www.facebook.com/me"
+
+    def __init__(self, message: str, email: str = None, password: str = None, typing_delay: float = 100):
+        self.message = message
+        self.email = email or os.getenv("FACEBOOK_EMAIL")
+        self.password = password or os.getenv("FACEBOOK_PASSWORD")
+        self.typing_delay = typing_delay
+
+    async def is_logged_in(self, page) -> bool:
+        await page.goto(self.HOME_URL)
+        # 未登入時首頁會出現帳號輸入框
+        return not await wait_visible(page.locator("#email"), timeout=5000)
+
+    async def login(self, page) -> None:
+        await page.goto(self.HOME_URL)
+        await page.fill("#email", self.email)
+        await page.fill("#pass", self.password)
+        await page.press("#pass", "Enter")
+        await page.locator("#email").wait_for(state="detached", timeout=30000)
+
+    async def run(self, page) -> str:
+        async with self.step("open_profile", page):
+            await page.goto(self.PROFILE_URL)
+
+        # 點擊「在想些什麼？」開啟發文對話框
+        async with self.step("open_post_dialog", page):
+            await page.locator("span:has-text('在想些什麼？')").first.click()
+            post_box = page.locator("div[role='dialog'] div[contenteditable='true']").first
+            await self.wait(post_box, "post_box")
+
+        # 模仿真人輸入，並確保 Facebook 偵測到輸入
+        async with self.step("type_message", page):
+            await post_box.click()
+            await page.keyboard.type(self.message, delay=self.typing_delay)
+            await post_box.dispatch_event("input")
+
+        # 等待「發佈」按鈕變成可點擊後發佈，再等對話框關閉
+        async with self.step("publish", page):
+            publish_button = page.locator("div[aria-label='發佈']:not([aria-disabled='true'])")
+            await self.wait(publish_button, "publish_enabled")
+            await publish_button.click()
+            await self.wait(post_box, "dialog_closed", state="detached", timeout=30000)
+        print("貼文成功發佈！")
+        return self.message
+
+    def __repr__(self) -> str:
+        return f"FacebookPostJob({self.message[:20]!r})"
@@ -0,0 +1,158 @@
+import os
+import json
+import asyncio
+from contextlib import nullcontext
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+
+from common.step_tracer import DEFAULT_REPORT_DIR, StepTracer, write_report
+
+DEFAULT_STATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "browser_state")
+
+
+class BrowserJob:
+    """
+    一個瀏覽器自動化工作。子類別設定 site (共用登入狀態的名稱)，並實作：
+      - is_logged_in(page)：打開網站並判斷目前是否已登入
+      - login(page)：登入
+      - run(page)：實際的步驟，回傳結果；以 self.step() / self.wait() 包住各步驟即可記錄耗時
+    """
+
+    site = None
+    tracer = None
+
+    def step(self, name: str, page=None):
+        return self.tracer.step(name, page) if self.tracer is not None else nullcontext()
+
+    async def wait(self, locator, label: str = None, state: str = "visible", timeout: float = 10000) -> None:
+        if self.tracer is not None:
+            await self.tracer.wait(locator, label, state, timeout)
+        else:
+            await locator.wait_for(state=state, timeout=timeout)
+
+    async def is_logged_in(self, page) -> bool:
+        return True
+
+    async def login(self, page) -> None:
+        pass
+
+    async def run(self, page):
+        raise NotImplementedError
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.site})"
+
+
+class BrowserPool:
+    """
+    非同步的瀏覽器執行器：一個 Chromium、最多 size 個 context 同時執行工作。
+      - 每個網站的登入狀態 (storage state) 存在 state_dir/<site>.json，新的 context 直接沿用
+      - 同一網站需要重新登入時只讓一個工作登入，其他工作等待後載入新的登入狀態
+      - 成功的 context 保留給同網站的下一個工作使用；失敗的 context 直接關閉
+      - 每個工作附一個 StepTracer，結束時把整批的步驟計時寫成一份 JSON 報告 (report_dir)
+    用法：
+        async with BrowserPool(size=4) as pool:
+            results = await pool.run_all([TodoistTaskJob("AAPL"), TodoistTaskJob("MSFT")])
+    """
+
+    def __init__(self, size: int = 4, headless: bool = True, state_dir: str = DEFAULT_STATE_DIR,
+                 name: str = "run", debug: bool = None, report_dir: str = DEFAULT_REPORT_DIR):
+        self.size = size
+        self.headless = headless
+        self.state_dir = state_dir
+        self.name = name
+        self.debug = debug
+        self.report_dir = report_dir
+        self.tracers = []
+        self._semaphore = asyncio.Semaphore(size)
+        self._idle = {}
+        self._site_locks = {}
+        self._playwright = None
+        self._browser = None
+
+    async def __aenter__(self):
+        self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.launch(headless=self.headless)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._browser.close()
+        await self._playwright.stop()
+        if self.tracers:
+            write_report(self.tracers, self.report_dir, self.name)
+
+    def state_path(self, site: str) -> str:
+        return os.path.join(self.state_dir, f"{site}.json")
+
+    async def _acquire(self, site: str):
+        idle = self._idle.setdefault(site, [])
+        if idle:
+            return idle.pop()
+        path = self.state_path(site) if site else None
+        return await self._browser.new_context(storage_state=path if path and os.path.exists(path) else None)
+
+    def _release(self, site: str, context) -> None:
+        self._idle.setdefault(site, []).append(context)
+
+    async def _ensure_login(self, job: BrowserJob, context, page) -> None:
+        if job.site is None or await job.is_logged_in(page):
+            return
+        lock = self._site_locks.setdefault(job.site, asyncio.Lock())
+        async with lock:
+            # 等待期間可能已有其他工作登入完成，先載入最新的 cookie 再檢查一次
+            path = self.state_path(job.site)
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    await context.add_cookies(json.load(f).get("cookies", []))
+                if await job.is_logged_in(page):
+                    return
+            await job.login(page)
+            os.makedirs(self.state_dir, exist_ok=True)
+            await context.storage_state(path=path)
+
+    async def run(self, job: BrowserJob):
+        async with self._semaphore:
+            context = await self._acquire(job.site)
+            page = await context.new_page()
+            tracer = StepTracer(repr(job), self.debug, self.report_dir)
+            job.tracer = tracer
+            self.tracers.append(tracer)
+            await tracer.start(context)
+            healthy = False
+            try:
+                async with tracer.step("login", page):
+                    await self._ensure_login(job, context, page)
+                result = await job.run(page)
+                tracer.finish()
+                healthy = True
+                return result
+            except Exception as e:
+                tracer.finish(e)
+                # 失敗發生在 step() 之外時補一張截圖
+                if not any(step["status"] == "failed" for step in tracer.steps):
+                    await tracer.screenshot(page, "failure")
+                raise
+            finally:
+                await tracer.stop(context)
+                if healthy:
+                    await page.close()
+                    self._release(job.site, context)
+                else:
+                    # 失敗的 context 可能停在對話框、錯誤頁或失效的登入狀態，不交給下一個工作
+                    await context.close()
+
+    async def run_all(self, jobs: list) -> list:
+        """平行執行所有工作；失敗的工作回傳 Exception，不影響其他工作。"""
+        results = await asyncio.gather(*(self.run(job) for job in jobs), return_exceptions=True)
+        for job, result in zip(jobs, results):
+            if isinstance(result, Exception):
+                print(f"❌ {job} 失敗：{result}")
+        return results
+
+
+async def wait_visible(locator, timeout: float = 10000) -> bool:
+    """等待元素出現，逾時回傳 False (用來判斷頁面狀態，而不是固定等待秒數)。"""
+    try:
+        await locator.wait_for(state="visible", timeout=timeout)
+        return True
+    except PlaywrightTimeoutError:
+        return False
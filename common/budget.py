@@ -0,0 +1,124 @@
+import os
+import time
+import asyncio
+
+from autogen_core import CancellationToken
+from autogen_agentchat.base import TaskResult
+from autogen_agentchat.conditions import MaxMessageTermination, TextMentionTermination, TokenUsageTermination
+
+# 無人值守 (AGENT_HEADLESS) 卻沒設定 AGENT_MAX_TURNS 時的訊息數上限
+DEFAULT_HEADLESS_MAX_TURNS = 20
+# 取消後等待 team 收尾 (停止 runtime) 的秒數，超過就不再等待
+CANCEL_GRACE_SECONDS = 5.0
+
+
+def budget_from_env() -> dict:
+    """
+    從環境變數 (.env) 讀取批次執行的預算設定：
+      AGENT_HEADLESS=1         不加入 UserProxyAgent，無人值守執行
+      AGENT_MAX_TURNS          最多幾則訊息 (headless 時預設 DEFAULT_HEADLESS_MAX_TURNS)
+      AGENT_MAX_TOKENS         prompt + completion 累計 token 上限
+      AGENT_TIMEOUT_SECONDS    每個批次的執行時間上限 (秒)
+    """
+    def _number(name, cast):
+        value = os.getenv(name)
+        return cast(value) if value else None
+
+    headless = os.getenv("AGENT_HEADLESS", "0").lower() in ("1", "true", "yes")
+    max_turns = _number("AGENT_MAX_TURNS", int)
+    if headless and max_turns is None:
+        # 沒有人可以輸入 exit，不能讓對話無限進行
+        max_turns = DEFAULT_HEADLESS_MAX_TURNS
+
+    return {
+        "headless": headless,
+        "max_turns": max_turns,
+        "max_tokens": _number("AGENT_MAX_TOKENS", int),
+        "timeout_seconds": _number("AGENT_TIMEOUT_SECONDS", float),
+    }
+
+
+def build_termination(max_turns: int = None, max_tokens: int = None, stop_text: str = "exit"):
+    """組合終止條件：出現 stop_text、訊息數達 max_turns、或累計 token 達 max_tokens，任一成立即停止。"""
+    condition = TextMentionTermination(stop_text)
+    if max_turns:
+        condition = condition | MaxMessageTermination(max_turns)
+    if max_tokens:
+        condition = condition | TokenUsageTermination(max_total_token=max_tokens)
+    return condition
+
+
+class BudgetedRun:
+    """
+    包裝 team.run_stream()，加上硬性的執行時間上限：
+      - run_stream 綁定一個 CancellationToken，超過 timeout_seconds 時 cancel()，
+        取消正在進行的模型呼叫與 team 的 runtime，再結束串流
+      - 結束後 stop_reason 記錄終止原因 (終止條件的訊息、timeout 或 completed)，
+        timed_out 表示是否因逾時中斷 (結果不完整)
+    用法：
+        run = BudgetedRun(team, task, timeout_seconds=300)
+        async for event in run:
+            ...
+        print(run.stop_reason)
+    """
+
+    def __init__(self, team, task, timeout_seconds: float = None):
+        self.team = team
+        self.task = task
+        self.timeout_seconds = timeout_seconds
+        self.stop_reason = None
+        self.timed_out = False
+        self.elapsed = 0.0
+
+    async def __aiter__(self):
+        start = time.monotonic()
+        token = CancellationToken()
+        stream = self.team.run_stream(task=self.task, cancellation_token=token)
+        pending = None
+        finished = False
+        try:
+            while True:
+                remaining = None
+                if self.timeout_seconds is not None:
+                    remaining = max(0.0, self.timeout_seconds - (time.monotonic() - start))
+                # 不用 wait_for：它逾時後會等串流的 finally (等 runtime 閒置) 跑完才返回
+                pending = asyncio.ensure_future(stream.__anext__())
+                done, _ = await asyncio.wait([pending], timeout=remaining)
+                if not done:
+                    self.timed_out = True
+                    self.stop_reason = f"timeout after {self.timeout_seconds:g}s"
+                    break
+                try:
+                    event = pending.result()
+                except StopAsyncIteration:
+                    finished = True
+                    break
+                pending = None
+                if isinstance(event, TaskResult):
+                    self.stop_reason = event.stop_reason or "completed"
+                yield event
+        finally:
+            if not finished:
+                await self._cancel(token, stream, pending)
+            self.elapsed = time.monotonic() - start
+            if self.stop_reason is None:
+                self.stop_reason = "completed"
+
+    @staticmethod
+    async def _cancel(token, stream, pending) -> None:
+        """取消 team 的執行並關閉串流；最多各等 CANCEL_GRACE_SECONDS 秒。"""
+        token.cancel()
+        if pending is not None and not pending.done():
+            # 取消後 run_stream 會拋出 CancelledError 並停止 runtime
+            done, _ = await asyncio.wait([pending], timeout=CANCEL_GRACE_SECONDS)
+            if not done:
+                pending.cancel()
+                return
+        if pending is not None and not pending.cancelled():
+            pending.exception()
+        closing = asyncio.ensure_future(stream.aclose())
+        done, _ = await asyncio.wait([closing], timeout=CANCEL_GRACE_SECONDS)
+        if not done:
+            closing.cancel()
+        elif not closing.cancelled():
+            closing.exception()
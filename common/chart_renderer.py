@@ -0,0 +1,106 @@
+import os
+import time
+import tempfile
+import threading
+import plotly.io as pio
+import plotly.graph_objects as go
+
+
+class ChartRenderer:
+    """
+    整個行程共用的 Plotly 圖表轉圖服務：
+      - 第一次使用時先啟動 Kaleido 並畫一張空白圖暖機，之後每張圖不再付啟動成本
+      - render() 以 pio.to_image 直接輸出 bytes (PNG 等)，不經過暫存檔
+      - render_many() 一次處理多張圖：Kaleido 1.x 以 pio.write_images 整批送出，
+        常駐瀏覽器開 tabs 個分頁平行繪製 (write_images 只能寫檔，整批寫到暫存資料夾再讀回)；
+        0.x 同時只能畫一張，以 lock 依序送出
+    支援 Kaleido 1.x (持久的瀏覽器服務) 與 0.x (pio.kaleido.scope 常駐子行程)。
+    """
+
+    def __init__(self, format: str = "png", width: int = None, height: int = None, scale: float = 1, tabs: int = 4):
+        self.format = format
+        self.width = width
+        self.height = height
+        self.scale = scale
+        self.tabs = tabs
+        self._batch = False
+        self.warmup_seconds = None
+        self._warm = False
+        self._lock = threading.Lock()
+
+    def _start_server(self) -> None:
+        try:
+            import kaleido
+        except ImportError:
+            return
+        # Kaleido 1.x：啟動一個常駐的瀏覽器，之後的 pio.to_image 都共用它
+        start = getattr(kaleido, "start_sync_server", None)
+        if start is not None:
+            try:
+                start(n=self.tabs, silence_warnings=True)
+            except RuntimeError:
+                # 已經有人啟動過
+                pass
+            # plotly >= 6.1 的 write_images 會把整批圖交給同一個 Kaleido
+            self._batch = hasattr(pio, "write_images")
+
+    def warm(self) -> None:
+        with self._lock:
+            if self._warm:
+                return
+            started = time.perf_counter()
+            self._start_server()
+            pio.to_image(go.Figure(), format=self.format, width=100, height=100)
+            self.warmup_seconds = time.perf_counter() - started
+            self._warm = True
+
+    def render(self, figure, format: str = None, width: int = None, height: int = None, scale: float = None) -> bytes:
+        """把一張 figure 轉成圖檔內容 (bytes)。"""
+        self.warm()
+        with self._lock:
+            return self._to_image(figure, format, width, height, scale)
+
+    def _to_image(self, figure, format, width, height, scale) -> bytes:
+        return pio.to_image(
+            figure,
+            format=format or self.format,
+            width=width or self.width,
+            height=height or self.height,
+            scale=scale or self.scale,
+        )
+
+    def render_many(self, figures, format: str = None, width: int = None, height: int = None, scale: float = None) -> list:
+        """把多張 figure 轉成 bytes (順序與 figures 相同)，整批只取一次 lock。"""
+        figures = list(figures)
+        self.warm()
+        with self._lock:
+            # 只有一張圖時整批送出沒有好處，直接用 to_image 省下寫檔再讀回
+            if self._batch and len(figures) > 1:
+                return self._render_batch(figures, format or self.format, width or self.width,
+                                          height or self.height, scale or self.scale)
+            return [self._to_image(figure, format, width, height, scale) for figure in figures]
+
+    def _render_batch(self, figures, format, width, height, scale) -> list:
+        # pio.write_images 只能輸出到檔案，先整批寫到暫存資料夾再讀回來
+        with tempfile.TemporaryDirectory(prefix="charts_") as tmp_dir:
+            paths = [os.path.join(tmp_dir, f"{i}.{format}") for i in range(len(figures))]
+            pio.write_images(figures, paths, format=format, width=width, height=height, scale=scale)
+            images = []
+            for path in paths:
+                # Kaleido 不會拋出個別圖表的錯誤，只會少寫那個檔案
+                if not os.path.exists(path):
+                    raise RuntimeError(f"Kaleido 無法輸出第 {len(images) + 1} 張圖")
+                with open(path, "rb") as f:
+                    images.append(f.read())
+            return images
+
+    def write(self, figure, path: str, **kwargs) -> str:
+        """render() 後寫到檔案，取代 figure.write_image(path)。"""
+        data = self.render(figure, **kwargs)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+
+# 整個行程共用一個 renderer
+chart_renderer = ChartRenderer()
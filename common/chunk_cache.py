@@ -0,0 +1,76 @@
+import os
+import json
+import hashlib
+
+import pandas as pd
+
+# 快取內容的格式版本 (改變存放內容時調整，舊檔案就不會被讀到)
+CACHE_FORMAT = 2
+# 預設快取目錄 (專案根目錄下的 .cache/chunks)
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "chunks")
+
+
+class ChunkCache:
+    """
+    批次結果的磁碟快取：
+      - 存的是 process_chunk 回傳的批次摘要，完整對話只在對話紀錄 (JSONL) 中
+      - key = prompt_version + 附加的 prompt 內容 (context) + 批次內容 (CSV 文字) 的 SHA-256
+      - context 放其他會影響代理人回答的輸入，例如事先搜尋的資料、預先計算的統計；內容一變就重新分析
+      - CSV 只會往後新增資料，所以重跑時只有最後一個 (變動的) 批次與新批次需要重新呼叫代理人
+      - 修改 prompt 時請更新 prompt_version，舊結果就不會再被使用
+    """
+
+    def __init__(self, prompt_version: str, cache_dir: str = DEFAULT_CACHE_DIR, context=()):
+        self.prompt_version = prompt_version
+        self.cache_dir = cache_dir
+        # None 與空字串視為相同 (沒有這項資料)
+        self._context_digest = hashlib.sha256("".join(
+            hashlib.sha256((text or "").encode("utf-8")).hexdigest() for text in context
+        ).encode("ascii")).hexdigest()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, chunk: pd.DataFrame) -> str:
+        content = chunk.to_csv(index=False).encode("utf-8")
+        prefix = f"{CACHE_FORMAT}\0{self.prompt_version}\0{self._context_digest}\0".encode("utf-8")
+        return hashlib.sha256(prefix + content).hexdigest()
+
+    def _path(self, chunk: pd.DataFrame) -> str:
+        return os.path.join(self.cache_dir, f"{self.key(chunk)}.json")
+
+    def get(self, chunk: pd.DataFrame):
+        path = self._path(chunk)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def set(self, chunk: pd.DataFrame, summary: dict) -> None:
+        path = self._path(chunk)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+
+    async def get_or_run(self, chunk: pd.DataFrame, start_idx: int, run, log_writer=None, cache_if=None) -> dict:
+        """
+        有快取時直接回傳快取的批次摘要 (批次編號改成這次的位置，並寫入 log_writer)；
+        否則 await run() 執行代理人 (完整對話由 run 自己寫入紀錄)，cache_if(summary) 為 True (預設皆是)
+        時才存進快取，例如逾時中斷的批次就不應該被快取。
+        """
+        cached = self.get(chunk)
+        if cached is None:
+            self.misses += 1
+            summary = await run()
+            if cache_if is None or cache_if(summary):
+                self.set(chunk, summary)
+            return summary
+
+        self.hits += 1
+        cached["batch_start"] = start_idx
+        cached["batch_end"] = start_idx + len(chunk) - 1
+        cached["cached"] = True
+        if log_writer is not None:
+            await log_writer.put(cached)
+        return cached
@@ -0,0 +1,83 @@
+import os
+import json
+import uuid
+import asyncio
+from datetime import datetime
+
+import pandas as pd
+
+
+class ConversationLogWriter:
+    """
+    只會附加 (append-only) 的 JSONL 對話紀錄寫入器：
+      - 各批次透過 put() 把訊息丟進 asyncio.Queue，由單一背景 task 依序寫入
+      - 每寫一則就 flush (fsync=True 時也同步到磁碟)，某個批次失敗或程式中斷
+        也不會遺失已產生的訊息
+      - 每則紀錄都帶有 run_id，同一個檔案可以保存多次執行的結果
+    使用 async with 開啟，離開時會等佇列寫完再關檔。
+    """
+
+    def __init__(self, path: str, run_id: str = None, fsync: bool = False, echo: bool = False):
+        self.path = path
+        # 同一秒開始的兩次執行靠 uuid 區分，不會混在同一個 run_id 底下
+        self.run_id = run_id or f"{datetime.now():%Y%m%d_%H%M%S}_{uuid.uuid4().hex[:8]}"
+        self.fsync = fsync
+        self.echo = echo
+        self._queue = asyncio.Queue()
+        self._file = None
+        self._worker = None
+        self.count = 0
+
+    async def __aenter__(self):
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._worker = asyncio.create_task(self._consume())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._queue.put(None)
+        await self._worker
+        self._file.close()
+
+    async def put(self, record: dict) -> None:
+        await self._queue.put(record)
+
+    async def _consume(self):
+        while True:
+            record = await self._queue.get()
+            if record is None:
+                break
+            record = {"run_id": self.run_id, "logged_at": datetime.now().isoformat(timespec="milliseconds"), **record}
+            self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self.count += 1
+            if self.echo:
+                print(f"[{record.get('source')}] => {record.get('content')}\n")
+
+
+def read_log(jsonl_path: str, run_id: str = None) -> pd.DataFrame:
+    """讀回 JSONL 紀錄；寫到一半被中斷的最後一行會被略過。"""
+    records = []
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    df = pd.DataFrame(records)
+    if run_id is not None and not df.empty:
+        df = df[df["run_id"] == run_id]
+    return df
+
+
+def compact_log(jsonl_path: str, csv_path: str, run_id: str = None) -> pd.DataFrame:
+    """將 JSONL 紀錄整理成最終的 CSV (依批次排序)，回傳整理後的 DataFrame。"""
+    df = read_log(jsonl_path, run_id)
+    if "batch_start" in df.columns:
+        df = df.sort_values(["batch_start", "logged_at"], kind="stable")
+    df.drop(columns=["run_id", "logged_at"], errors="ignore").to_csv(csv_path, index=False, encoding="utf-8-sig")
+    return df
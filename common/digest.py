@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+
+def _to_datetime(series: pd.Series) -> pd.Series:
+    # 只接受大部分都能轉成日期的欄位，避免把一般文字誤判成時間
+    converted = pd.to_datetime(series, errors="coerce", format="mixed")
+    return converted if converted.notna().mean() >= 0.8 else None
+
+
+def _numeric_summary(name: str, values: pd.Series) -> str:
+    arr = values.to_numpy(dtype=float)
+    arr = arr[~np.isnan(arr)]
+    if arr.size == 0:
+        return f"- {name}: 無有效數值"
+
+    q1, median, q3 = np.percentile(arr, [25, 50, 75])
+    iqr = q3 - q1
+    outliers = arr[(arr < q1 - 1.5 * iqr) | (arr > q3 + 1.5 * iqr)]
+
+    # 以首尾 10% 平均值比較趨勢，避免單一筆資料造成雜訊
+    edge = max(1, arr.size // 10)
+    head, tail = arr[:edge].mean(), arr[-edge:].mean()
+    change = (tail - head) / abs(head) * 100 if head else np.nan
+
+    text = (
+        f"- {name}: n={arr.size}, mean={arr.mean():.4g}, std={arr.std():.4g}, "
+        f"min={arr.min():.4g}, p25={q1:.4g}, median={median:.4g}, p75={q3:.4g}, max={arr.max():.4g}"
+    )
+    if not np.isnan(change):
+        text += f", 首尾變化={change:+.2f}%"
+    if outliers.size:
+        text += f", 離群值 {outliers.size} 筆 (例: {', '.join(f'{v:.4g}' for v in outliers[:3])})"
+    return text
+
+
+def _categorical_summary(name: str, values: pd.Series, top_k: int) -> str:
+    counts = values.dropna().astype(str).str.replace(r"\s+", " ", regex=True).str.strip().value_counts()
+    if counts.empty:
+        return f"- {name}: 全部為空值"
+    top = ", ".join(f"{k}={v}" for k, v in counts.head(top_k).items())
+    more = f"，其餘 {len(counts) - top_k} 類" if len(counts) > top_k else ""
+    return f"- {name}: {len(counts)} 類，前 {min(top_k, len(counts))} 名 {top}{more}"
+
+
+def _time_summary(name: str, times: pd.Series, freq: str) -> str:
+    times = times.dropna()
+    if times.empty:
+        return f"- {name}: 無有效時間"
+    buckets = times.dt.to_period(freq).value_counts().sort_index()
+    bucket_text = ", ".join(f"{k}={v}" for k, v in buckets.items())
+
+    # 純日期欄位 (時間皆為 00:00) 不需要顯示時段分佈
+    date_only = bool((times.dt.normalize() == times).all())
+    fmt = "%Y-%m-%d" if date_only else "%Y-%m-%d %H:%M"
+    text = f"- {name}: {times.min():{fmt}} ~ {times.max():{fmt}}；依 {freq} 計數: {bucket_text}"
+    if not date_only:
+        hours = np.bincount(times.dt.hour.to_numpy(), minlength=24)
+        busiest = np.argsort(hours)[::-1][:3]
+        text += f"；最常見時段: {', '.join(f'{h}時({hours[h]})' for h in busiest if hours[h])}"
+    return text
+
+
+def digest_chunk(chunk: pd.DataFrame, top_k: int = 5, time_freq: str = "D", max_buckets: int = 31) -> str:
+    """
+    將一個批次的 DataFrame 壓縮成精簡的統計摘要文字：
+      - 數值欄位：分佈 (平均、分位數)、首尾趨勢與 IQR 離群值
+      - 日期欄位：時間範圍、依 time_freq 分桶的筆數與最常見時段
+      - 類別欄位：類別數與前 top_k 名的次數
+    空欄位會被略過。分桶數超過 max_buckets 時自動改用月份分桶。
+    """
+    lines = [f"資料筆數: {len(chunk)}，欄位數: {chunk.shape[1]}"]
+    for name in chunk.columns:
+        column = chunk[name]
+        if column.isna().all():
+            continue
+
+        if pd.api.types.is_numeric_dtype(column):
+            numeric = column
+        else:
+            numeric = pd.to_numeric(column, errors="coerce")
+            if numeric.notna().mean() < 0.8:
+                numeric = None
+
+        if numeric is not None:
+            # 只有 0/1 或很少種值的數字欄位當作類別處理較有意義
+            if numeric.nunique() <= 2:
+                lines.append(_categorical_summary(str(name), column, top_k))
+            else:
+                lines.append(_numeric_summary(str(name), numeric))
+            continue
+
+        times = _to_datetime(column)
+        if times is not None:
+            freq = time_freq
+            if times.dt.to_period(freq).nunique() > max_buckets:
+                freq = "M"
+            lines.append(_time_summary(str(name), times, freq))
+            continue
+
+        lines.append(_categorical_summary(str(name), column, top_k))
+    return "\n".join(lines)
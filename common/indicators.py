@@ -0,0 +1,212 @@
+import os
+import json
+import pickle
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS = 252
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "indicators")
+
+# 預設指標參數；MA 視窗可依各 app 需求調整 (例如 Final_Project 用 20/60，EMO 用 50/200)
+DEFAULT_PARAMS = {
+    "sma": (20, 60),
+    "ema": (12, 26),
+    "rsi": 14,
+    "macd": (12, 26, 9),
+    "bollinger": (20, 2.0),
+    "atr": 14,
+    "volatility": 20,
+}
+
+
+def _as_2d(x) -> np.ndarray:
+    """Series / 1 維陣列轉成 T x 1，DataFrame 轉成 T x N 的 float 陣列。"""
+    x = np.asarray(x, dtype=float)
+    return x[:, None] if x.ndim == 1 else x
+
+
+def _window_sums(x: np.ndarray, window: int):
+    """以累積和計算每個視窗的總和、平方和與有效值個數 (NaN 不計入)。"""
+    valid = ~np.isnan(x)
+    filled = np.where(valid, x, 0.0)
+    zero = np.zeros((1, x.shape[1]))
+    s1 = np.vstack([zero, np.cumsum(filled, axis=0)])
+    s2 = np.vstack([zero, np.cumsum(filled ** 2, axis=0)])
+    n = np.vstack([zero, np.cumsum(valid, axis=0)])
+    return s1[window:] - s1[:-window], s2[window:] - s2[:-window], n[window:] - n[:-window]
+
+
+def _pad(values: np.ndarray, window: int) -> np.ndarray:
+    """前面補 window - 1 列 NaN，讓結果與輸入的日期對齊。"""
+    return np.vstack([np.full((window - 1, values.shape[1]), np.nan), values])
+
+
+def sma(x, window: int) -> np.ndarray:
+    """簡單移動平均，視窗內資料不足 window 筆時為 NaN。"""
+    x = _as_2d(x)
+    if len(x) < window:
+        return np.full(x.shape, np.nan)
+    sum1, _, n = _window_sums(x, window)
+    return _pad(np.where(n == window, sum1 / window, np.nan), window)
+
+
+def rolling_std(x, window: int) -> np.ndarray:
+    """滾動樣本標準差 (ddof=1)。"""
+    x = _as_2d(x)
+    if len(x) < window:
+        return np.full(x.shape, np.nan)
+    sum1, sum2, n = _window_sums(x, window)
+    var = (sum2 - sum1 ** 2 / window) / (window - 1)
+    return _pad(np.where(n == window, np.sqrt(np.clip(var, 0, None)), np.nan), window)
+
+
+def ema(x, span: int = None, alpha: float = None) -> np.ndarray:
+    """
+    指數移動平均 (與 pandas ewm(adjust=False) 相同)。
+    時間方向逐日遞推，但每一步同時處理所有股票；各股票從第一個有效值開始計算，NaN 沿用前值。
+    """
+    x = _as_2d(x)
+    alpha = alpha if alpha is not None else 2 / (span + 1)
+    out = np.empty_like(x)
+    prev = np.full(x.shape[1], np.nan)
+    for t in range(len(x)):
+        row = x[t]
+        prev = np.where(np.isnan(prev), row, np.where(np.isnan(row), prev, prev + alpha * (row - prev)))
+        out[t] = prev
+    return out
+
+
+def rsi(close, window: int = 14) -> np.ndarray:
+    """Wilder RSI (0–100)。"""
+    close = _as_2d(close)
+    delta = np.vstack([np.full((1, close.shape[1]), np.nan), np.diff(close, axis=0)])
+    gain = ema(np.clip(delta, 0, None), alpha=1 / window)
+    loss = ema(np.clip(-delta, 0, None), alpha=1 / window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        value = 100 - 100 / (1 + gain / loss)
+    value = np.where(loss == 0, np.where(gain > 0, 100.0, 50.0), value)
+    # 前 window 天資料不足
+    value[:window] = np.nan
+    return np.where(np.isnan(close), np.nan, value)
+
+
+def macd(close, fast: int = 12, slow: int = 26, signal: int = 9):
+    """回傳 (MACD 線, 訊號線, 柱狀體)。"""
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = ema(line, signal)
+    return line, signal_line, line - signal_line
+
+
+def bollinger(close, window: int = 20, k: float = 2.0):
+    """回傳 (中軌, 上軌, 下軌)。"""
+    mid = sma(close, window)
+    std = rolling_std(close, window)
+    return mid, mid + k * std, mid - k * std
+
+
+def atr(high, low, close, window: int = 14) -> np.ndarray:
+    """Wilder 平均真實區間。"""
+    high, low, close = _as_2d(high), _as_2d(low), _as_2d(close)
+    prev_close = np.vstack([np.full((1, close.shape[1]), np.nan), close[:-1]])
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    return ema(true_range, alpha=1 / window)
+
+
+def volatility(close, window: int = 20) -> np.ndarray:
+    """日報酬的滾動年化波動率。"""
+    close = _as_2d(close)
+    returns = np.vstack([np.full((1, close.shape[1]), np.nan), close[1:] / close[:-1] - 1])
+    return rolling_std(returns, window) * np.sqrt(TRADING_DAYS)
+
+
+def drawdown(close) -> np.ndarray:
+    """相對歷史高點的回撤 (0 到 -1)。"""
+    close = _as_2d(close)
+    return close / np.fmax.accumulate(close, axis=0) - 1
+
+
+def compute_indicators(close, high=None, low=None, params: dict = None) -> dict:
+    """
+    一次計算整組指標。close / high / low 為 (日期 x 股票) 的陣列或 DataFrame，
+    回傳 {欄位名稱: T x N 陣列}；沒有 high / low 時略過 ATR。
+    """
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    close = _as_2d(close)
+    result = {}
+    for window in params["sma"]:
+        result[f"SMA{window}"] = sma(close, window)
+    for span in params["ema"]:
+        result[f"EMA{span}"] = ema(close, span)
+    result["RSI"] = rsi(close, params["rsi"])
+    result["MACD"], result["MACD_signal"], result["MACD_hist"] = macd(close, *params["macd"])
+    result["BB_mid"], result["BB_upper"], result["BB_lower"] = bollinger(close, *params["bollinger"])
+    if high is not None and low is not None:
+        result["ATR"] = atr(high, low, close, params["atr"])
+    result["Volatility"] = volatility(close, params["volatility"])
+    result["Drawdown"] = drawdown(close)
+    return result
+
+
+def compute_panel(close: pd.DataFrame, high: pd.DataFrame = None, low: pd.DataFrame = None,
+                  params: dict = None) -> dict:
+    """多檔股票版本：輸入 (日期 x 股票) DataFrame，回傳 {指標名稱: (日期 x 股票) DataFrame}。"""
+    arrays = compute_indicators(close, high, low, params)
+    return {name: pd.DataFrame(values, index=close.index, columns=close.columns) for name, values in arrays.items()}
+
+
+def compute_frame(hist: pd.DataFrame, params: dict = None) -> pd.DataFrame:
+    """單一股票版本：在 OHLC 的 DataFrame 後面加上所有指標欄位。"""
+    arrays = compute_indicators(hist["Close"], hist.get("High"), hist.get("Low"), params)
+    return hist.assign(**{name: values[:, 0] for name, values in arrays.items()})
+
+
+def latest(panel_indicators: dict) -> pd.DataFrame:
+    """取每檔股票最後一天的指標值，得到 (股票 x 指標) 的表，方便篩選。"""
+    return pd.DataFrame({name: df.iloc[-1] for name, df in panel_indicators.items()})
+
+
+class IndicatorCache:
+    """
+    依股票代碼與資料日期區間快取 compute_frame() 的結果 (記憶體 + 磁碟 pickle)：
+    同一天重複查詢同一檔股票不必重算，有新的 K 棒時日期改變，自然算新的一份。
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._memory = {}
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, ticker: str, hist: pd.DataFrame, params: dict = None) -> str:
+        key_text = json.dumps([ticker.upper(), str(hist.index[0]), str(hist.index[-1]), len(hist),
+                               float(hist["Close"].iloc[-1]), {**DEFAULT_PARAMS, **(params or {})}])
+        return hashlib.sha256(key_text.encode("utf-8")).hexdigest()
+
+    def get_or_compute(self, ticker: str, hist: pd.DataFrame, params: dict = None) -> pd.DataFrame:
+        key = self.key(ticker, hist, params)
+        path = os.path.join(self.cache_dir, f"{key}.pkl")
+        with self._lock:
+            if key in self._memory:
+                return self._memory[key].copy()
+            if os.path.exists(path):
+                try:
+                    with open(path, "rb") as f:
+                        self._memory[key] = pickle.load(f)
+                    return self._memory[key].copy()
+                except (OSError, pickle.UnpicklingError, EOFError):
+                    pass
+
+        frame = compute_frame(hist, params)
+        with self._lock:
+            self._memory[key] = frame
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(frame, f)
+            os.replace(tmp_path, path)
+        return frame.copy()
+
+
+# 整個行程共用
+indicator_cache = IndicatorCache()
@@ -0,0 +1,66 @@
+import json
+import pandas as pd
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except ImportError:
+    _encoding = None
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文字的 token 數；沒有安裝 tiktoken 時以每 4 個字元 1 個 token 粗估。"""
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return max(1, len(text) // 4)
+
+
+def _format_value(value, precision: int) -> str:
+    if value is None or (not isinstance(value, (list, dict)) and pd.isna(value)):
+        return ""
+    if isinstance(value, pd.Timestamp):
+        # 時間為 00:00 時只保留日期，秒數為 0 時省略秒
+        if value == value.normalize():
+            return value.strftime("%Y-%m-%d")
+        return value.strftime("%Y-%m-%d %H:%M:%S" if value.second else "%Y-%m-%d %H:%M")
+    if isinstance(value, float):
+        if value.is_integer():
+            return str(int(value))
+        return f"{value:.{precision}f}".rstrip("0").rstrip(".")
+    # Tab 與換行是分隔符號，內容中出現時改成空白
+    return " ".join(str(value).split())
+
+
+def encode_frame(df: pd.DataFrame, precision: int = 3, parse_dates: bool = True) -> str:
+    """
+    將 DataFrame 轉成「一行標題 + 每列一行 TSV」的精簡格式，
+    欄位名稱只出現一次，不會像 to_dict(orient='records') 每列重複。
+      - 浮點數四捨五入到 precision 位並去除多餘的 0
+      - parse_dates=True 時，可轉換成日期的文字欄位會改寫成 YYYY-MM-DD [HH:MM[:SS]]
+    """
+    frame = df.copy()
+    if parse_dates:
+        for name in frame.columns:
+            if not pd.api.types.is_numeric_dtype(frame[name]) and not pd.api.types.is_datetime64_any_dtype(frame[name]):
+                converted = pd.to_datetime(frame[name], errors="coerce", format="mixed")
+                if converted.notna().any() and converted.notna().sum() == frame[name].notna().sum():
+                    frame[name] = converted
+
+    header = "\t".join(" ".join(str(name).split()) for name in frame.columns)
+    rows = [
+        "\t".join(_format_value(value, precision) for value in row)
+        for row in frame.itertuples(index=False, name=None)
+    ]
+    return "\n".join([header] + rows)
+
+
+def token_savings(df: pd.DataFrame, encoded: str) -> dict:
+    """比較 encode_frame 與原本 JSON records 寫法的 token 數。"""
+    baseline = json.dumps(df.to_dict(orient="records"), ensure_ascii=False, default=str)
+    baseline_tokens = estimate_tokens(baseline)
+    encoded_tokens = estimate_tokens(encoded)
+    return {
+        "baseline_tokens": baseline_tokens,
+        "encoded_tokens": encoded_tokens,
+        "saved_ratio": 1 - encoded_tokens / baseline_tokens if baseline_tokens else 0.0,
+    }
@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+
+from autogen_core.models import ChatCompletionClient, CreateResult
+
+# 預設錄製目錄 (專案根目錄下的 .cache/model_replay)
+DEFAULT_REPLAY_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "model_replay")
+
+
+def _json_default(obj):
+    # 圖片 (MultimodalWebSurfer 的截圖) 以 base64 參與雜湊
+    if hasattr(obj, "to_base64"):
+        return obj.to_base64()
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    return str(obj)
+
+
+def request_key(messages, tools=(), json_output=None, extra_create_args=None) -> str:
+    """以訊息內容、工具定義與參數計算請求的 SHA-256，作為錄製檔的 key。"""
+    payload = {
+        "messages": [m.model_dump() if hasattr(m, "model_dump") else m for m in messages],
+        "tools": [t.schema if hasattr(t, "schema") else t for t in tools],
+        "json_output": json_output,
+        "extra_create_args": extra_create_args or {},
+    }
+    text = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=_json_default)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class RecordReplayChatCompletionClient(ChatCompletionClient):
+    """
+    包裝任何 ChatCompletionClient 的錄製 / 重播用戶端：
+      - mode="record"：照常呼叫 inner client，並把每組 request/response 與延遲存到 replay_dir
+      - mode="replay"：直接從 replay_dir 讀取回覆，不呼叫 API；找不到時拋出 KeyError
+      - mode="auto"：有錄製檔就重播，沒有就呼叫並錄製
+    replay_latency=True 時重播會 sleep 錄製時的延遲，方便做接近真實的效能測試。
+    """
+
+    def __init__(self, inner: ChatCompletionClient, mode: str = "auto",
+                 replay_dir: str = DEFAULT_REPLAY_DIR, replay_latency: bool = False):
+        if mode not in ("record", "replay", "auto"):
+            raise ValueError(f"未知的 mode：{mode}")
+        self.inner = inner
+        self.mode = mode
+        self.replay_dir = replay_dir
+        self.replay_latency = replay_latency
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(replay_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.replay_dir, f"{key}.json")
+
+    def _load(self, key: str):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save(self, key: str, result: CreateResult, latency: float) -> None:
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"latency": latency, "result": result.model_dump()}, f, ensure_ascii=False, default=_json_default)
+        os.replace(tmp_path, path)
+
+    async def _replay(self, key: str):
+        entry = self._load(key) if self.mode != "record" else None
+        if entry is None:
+            if self.mode == "replay":
+                raise KeyError(f"找不到錄製的回覆：{key}")
+            return None
+        self.hits += 1
+        if self.replay_latency:
+            await asyncio.sleep(entry["latency"])
+        return CreateResult.model_validate(entry["result"])
+
+    async def create(self, messages, *, tools=[], json_output=None, extra_create_args={}, cancellation_token=None):
+        key = request_key(messages, tools, json_output, extra_create_args)
+        result = await self._replay(key)
+        if result is not None:
+            return result
+
+        self.misses += 1
+        start = time.monotonic()
+        result = await self.inner.create(messages, tools=tools, json_output=json_output,
+                                         extra_create_args=extra_create_args, cancellation_token=cancellation_token)
+        self._save(key, result, time.monotonic() - start)
+        return result
+
+    async def create_stream(self, messages, *, tools=[], json_output=None, extra_create_args={}, cancellation_token=None):
+        key = request_key(messages, tools, json_output, extra_create_args)
+        result = await self._replay(key)
+        if result is not None:
+            # 重播時不分段，直接回傳完整內容
+            if isinstance(result.content, str):
+                yield result.content
+            yield result
+            return
+
+        self.misses += 1
+        start = time.monotonic()
+        async for chunk in self.inner.create_stream(messages, tools=tools, json_output=json_output,
+                                                    extra_create_args=extra_create_args, cancellation_token=cancellation_token):
+            if isinstance(chunk, CreateResult):
+                self._save(key, chunk, time.monotonic() - start)
+            yield chunk
+
+    async def close(self):
+        if hasattr(self.inner, "close"):
+            await self.inner.close()
+
+    def actual_usage(self):
+        return self.inner.actual_usage()
+
+    def total_usage(self):
+        return self.inner.total_usage()
+
+    def count_tokens(self, messages, *, tools=[]):
+        return self.inner.count_tokens(messages, tools=tools)
+
+    def remaining_tokens(self, messages, *, tools=[]):
+        return self.inner.remaining_tokens(messages, tools=tools)
+
+    @property
+    def capabilities(self):
+        return self.inner.capabilities
+
+    @property
+    def model_info(self):
+        return self.inner.model_info
+
+
+def wrap_from_env(client: ChatCompletionClient) -> ChatCompletionClient:
+    """
+    依環境變數 MODEL_REPLAY_MODE (record / replay / auto) 包裝 client，未設定時原樣回傳。
+    MODEL_REPLAY_DIR 可指定錄製目錄，MODEL_REPLAY_LATENCY=1 時重播會模擬錄製時的延遲。
+    """
+    mode = os.getenv("MODEL_REPLAY_MODE")
+    if not mode:
+        return client
+    return RecordReplayChatCompletionClient(
+        client,
+        mode=mode,
+        replay_dir=os.getenv("MODEL_REPLAY_DIR", DEFAULT_REPLAY_DIR),
+        replay_latency=os.getenv("MODEL_REPLAY_LATENCY", "0").lower() in ("1", "true", "yes"),
+    )
@@ -0,0 +1,120 @@
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+
+# 預設快取目錄 (專案根目錄下的 .cache/search)
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "search")
+
+
+def normalize_key(query: str) -> str:
+    """查詢字串或網址正規化：去除前後空白、合併空白、轉小寫、去掉網址結尾的 /。"""
+    text = re.sub(r"\s+", " ", query.strip().lower())
+    if text.startswith(("http://", "https://")):
+        text = text.rstrip("/")
+    return text
+
+
+class SearchCache:
+    """
+    以檔案保存的網路搜尋 / 網頁抓取快取：
+      - 以正規化後的查詢字串或網址作為 key，每筆存成一個 JSON 檔
+      - 超過 ttl 秒的資料視為過期
+      - 同一個行程內，同時對同一個 key 的請求只會真正執行一次
+    不同批次、不同次執行只要使用同一個 cache_dir 就能共用結果。
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, ttl: float = 24 * 3600):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self._inflight = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha256(normalize_key(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def get(self, key: str):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry["created_at"] > self.ttl:
+            return None
+        return entry["value"]
+
+    def set(self, key: str, value) -> None:
+        path = self._path(key)
+        entry = {"key": normalize_key(key), "created_at": time.time(), "value": value}
+        # 先寫暫存檔再取代，避免其他行程讀到寫到一半的檔案
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    async def get_or_fetch(self, key: str, fetch, cache_if=None):
+        """
+        有快取就直接回傳；否則呼叫 fetch() (async) 取得結果，
+        cache_if(value) 為 True (預設皆是) 時才寫入快取，例如搜尋失敗的空結果就不應該被快取。
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        norm = normalize_key(key)
+        if norm in self._inflight:
+            return await asyncio.shield(self._inflight[norm])
+
+        task = asyncio.ensure_future(fetch())
+        self._inflight[norm] = task
+        try:
+            value = await task
+            if cache_if is None or cache_if(value):
+                self.set(key, value)
+            return value
+        finally:
+            self._inflight.pop(norm, None)
+
+
+async def run_web_research(query: str, model_client, cache: SearchCache = None) -> str:
+    """
+    在批次分派前只執行一次網路搜尋：由 MultimodalWebSurfer 搜尋 query 並整理重點，
+    結果寫入 cache，之後的批次與下一次執行都直接重用。
+    """
+    from autogen_agentchat.agents import AssistantAgent
+    from autogen_agentchat.conditions import MaxMessageTermination
+    from autogen_agentchat.messages import TextMessage
+    from autogen_agentchat.teams import RoundRobinGroupChat
+    from autogen_ext.agents.web_surfer import MultimodalWebSurfer
+
+    cache = cache or SearchCache()
+
+    async def fetch():
+        web_surfer = MultimodalWebSurfer("web_surfer", model_client)
+        summarizer = AssistantAgent(
+            "research_summarizer",
+            model_client,
+            system_message="請將搜尋到的資訊整理成條列式重點，並附上資料來源網址。",
+        )
+        team = RoundRobinGroupChat(
+            [web_surfer, summarizer],
+            termination_condition=MaxMessageTermination(3),
+        )
+        findings = []
+        try:
+            async for event in team.run_stream(task=query):
+                if isinstance(event, TextMessage) and event.source == "research_summarizer":
+                    findings.append(event.content)
+        finally:
+            # 搜尋中途失敗也要關閉瀏覽器
+            await web_surfer.close()
+        return "\n".join(findings)
+
+    # 沒有整理出任何內容 (例如搜尋失敗) 時不寫入快取，下次執行重新搜尋
+    return await cache.get_or_fetch(query, fetch, cache_if=lambda findings: bool(findings.strip()))
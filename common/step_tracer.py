@@ -0,0 +1,145 @@
+import os
+import re
+import json
+import time
+import uuid
+import datetime
+from contextlib import asynccontextmanager
+
+DEFAULT_REPORT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "playwright_runs")
+
+
+def debug_from_env() -> bool:
+    """PLAYWRIGHT_DEBUG=1 時每個步驟都截圖並保存 Playwright trace。"""
+    return os.getenv("PLAYWRIGHT_DEBUG", "0").lower() in ("1", "true", "yes")
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^0-9A-Za-z_-]+", "_", text).strip("_")[:60] or "job"
+
+
+class StepTracer:
+    """
+    記錄一個瀏覽器工作每個步驟的耗時與等待元素的時間：
+      - step()：量測一個步驟，失敗時截圖 (debug 模式下每個步驟結束都截圖)
+      - wait()：量測 locator.wait_for 的等待時間，歸在目前的步驟下
+      - start() / stop()：只有 debug 時才錄製 Playwright trace (含截圖) 並寫成 .zip；失敗時看截圖即可
+    平常執行不錄 trace、不截圖，只留下 to_dict() 的計時資料。
+    """
+
+    def __init__(self, name: str, debug: bool = None, artifact_dir: str = DEFAULT_REPORT_DIR):
+        self.name = name
+        self.debug = debug_from_env() if debug is None else debug
+        self.artifact_dir = artifact_dir
+        self.steps = []
+        self.status = "running"
+        self.error = None
+        self.trace_path = None
+        self._started = time.monotonic()
+        self._started_at = datetime.datetime.now().isoformat(timespec="seconds")
+        # 同一秒開始的同名工作 (例如平行的同一種 job) 靠 uuid 區分，截圖與 trace 不會互相覆蓋
+        self._prefix = f"{datetime.datetime.now():%Y%m%d_%H%M%S}_{_slug(name)}_{uuid.uuid4().hex[:8]}"
+        self._current = None
+        self._tracing = False
+
+    def _artifact(self, suffix: str) -> str:
+        os.makedirs(self.artifact_dir, exist_ok=True)
+        return os.path.join(self.artifact_dir, f"{self._prefix}_{suffix}")
+
+    async def start(self, context) -> None:
+        # 錄製 trace 會拖慢每個步驟，平常不錄
+        if not self.debug:
+            return
+        await context.tracing.start(screenshots=True, snapshots=True)
+        self._tracing = True
+
+    async def stop(self, context) -> None:
+        if not self._tracing:
+            return
+        self._tracing = False
+        self.trace_path = self._artifact("trace.zip")
+        await context.tracing.stop(path=self.trace_path)
+
+    @asynccontextmanager
+    async def step(self, name: str, page=None):
+        record = {"step": name, "seconds": 0.0, "status": "ok", "waits": []}
+        self.steps.append(record)
+        parent, self._current = self._current, record
+        started = time.monotonic()
+        try:
+            yield record
+        except Exception as e:
+            record["status"] = "failed"
+            record["error"] = f"{type(e).__name__}: {e}"
+            if page is not None:
+                record["screenshot"] = await self.screenshot(page, name)
+            raise
+        else:
+            if self.debug and page is not None:
+                record["screenshot"] = await self.screenshot(page, name)
+        finally:
+            record["seconds"] = round(time.monotonic() - started, 3)
+            self._current = parent
+
+    async def wait(self, locator, label: str = None, state: str = "visible", timeout: float = 10000) -> None:
+        started = time.monotonic()
+        entry = {"wait": label or str(locator), "state": state}
+        try:
+            await locator.wait_for(state=state, timeout=timeout)
+        except Exception:
+            entry["timed_out"] = True
+            raise
+        finally:
+            entry["seconds"] = round(time.monotonic() - started, 3)
+            if self._current is not None:
+                self._current["waits"].append(entry)
+
+    async def screenshot(self, page, step: str):
+        try:
+            path = self._artifact(f"{_slug(step)}.png")
+            await page.screenshot(path=path)
+            return path
+        except Exception:
+            # 頁面已關閉等情況下截圖失敗不影響原本的錯誤
+            return None
+
+    def finish(self, error: Exception = None) -> None:
+        self.status = "failed" if error is not None else "ok"
+        self.error = f"{type(error).__name__}: {error}" if error is not None else None
+
+    def to_dict(self) -> dict:
+        return {
+            "job": self.name,
+            "started_at": self._started_at,
+            "seconds": round(time.monotonic() - self._started, 3),
+            "status": self.status,
+            "error": self.error,
+            "trace": self.trace_path,
+            "steps": self.steps,
+        }
+
+
+def write_report(tracers: list, report_dir: str = DEFAULT_REPORT_DIR, name: str = "run") -> str:
+    """把一次執行所有工作的計時寫成 JSON，並附上各步驟 / 等待的總耗時排行。"""
+    jobs = [tracer.to_dict() for tracer in tracers]
+    step_totals = {}
+    wait_totals = {}
+    for job in jobs:
+        for step in job["steps"]:
+            step_totals[step["step"]] = step_totals.get(step["step"], 0) + step["seconds"]
+            for wait in step["waits"]:
+                wait_totals[wait["wait"]] = wait_totals.get(wait["wait"], 0) + wait["seconds"]
+
+    report = {
+        "name": name,
+        "finished_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "jobs": jobs,
+        "step_totals": dict(sorted(((k, round(v, 3)) for k, v in step_totals.items()), key=lambda kv: -kv[1])),
+        "wait_totals": dict(sorted(((k, round(v, 3)) for k, v in wait_totals.items()), key=lambda kv: -kv[1])),
+    }
+    os.makedirs(report_dir, exist_ok=True)
+    path = os.path.join(report_dir, f"{datetime.datetime.now():%Y%m%d_%H%M%S}_{_slug(name)}_{uuid.uuid4().hex[:8]}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"⏱️ 計時報告已儲存：{path}")
+    return path
@@ -0,0 +1,110 @@
+import json
+import time
+
+import pandas as pd
+
+# 依代理人名稱判斷時間是花在瀏覽網頁還是模型推論
+WEB_AGENT_KEYWORDS = ("web_surfer", "web_searcher", "news_analyst")
+
+
+def agent_kind(source: str) -> str:
+    if source in ("user", "user_proxy"):
+        return "user"
+    if any(keyword in source for keyword in WEB_AGENT_KEYWORDS):
+        return "web_surfer"
+    return "model"
+
+
+class Telemetry:
+    """
+    代理人執行的時間與 token 紀錄：
+      - track(run, chunk) 包住 BudgetedRun / run_stream，每則訊息記錄
+        產生所花時間 (距離上一則訊息)、輪次、token 數
+      - to_chrome_trace() 輸出 Chrome trace 格式 (chrome://tracing 或 Perfetto 開啟)
+      - summary() / to_summary_csv() 依 chunk 與代理人彙總時間與 token
+    """
+
+    def __init__(self):
+        self.origin = time.monotonic()
+        self.records = []
+        self.stops = []
+
+    async def track(self, stream, chunk):
+        """轉送 stream 的每個事件，並記錄每則訊息的耗時。chunk 用來區分批次 (例如批次起始編號或股票代碼)。"""
+        last = time.monotonic()
+        turn = 0
+        async for event in stream:
+            now = time.monotonic()
+            source = getattr(event, "source", None)
+            if source is not None:
+                usage = getattr(event, "models_usage", None)
+                self.records.append({
+                    "chunk": chunk,
+                    "turn": turn,
+                    "source": source,
+                    "kind": agent_kind(source),
+                    "type": getattr(event, "type", type(event).__name__),
+                    "start": last - self.origin,
+                    "latency": now - last,
+                    "prompt_tokens": usage.prompt_tokens if usage else 0,
+                    "completion_tokens": usage.completion_tokens if usage else 0,
+                })
+                turn += 1
+                last = now
+            yield event
+
+        stop_reason = getattr(stream, "stop_reason", None)
+        self.stops.append({"chunk": chunk, "stop_reason": stop_reason, "turns": turn, "end": time.monotonic() - self.origin})
+
+    def to_chrome_trace(self, path: str) -> None:
+        # 每個批次一條 thread，時間單位為微秒
+        events = [
+            {
+                "name": record["source"],
+                "cat": record["kind"],
+                "ph": "X",
+                "ts": record["start"] * 1e6,
+                "dur": record["latency"] * 1e6,
+                "pid": 1,
+                "tid": str(record["chunk"]),
+                "args": {key: record[key] for key in ("turn", "type", "prompt_tokens", "completion_tokens")},
+            }
+            for record in self.records
+        ]
+        events += [
+            {"name": f"stop: {stop['stop_reason']}", "ph": "i", "s": "t", "ts": stop["end"] * 1e6, "pid": 1, "tid": str(stop["chunk"])}
+            for stop in self.stops
+        ]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+
+    def summary(self) -> pd.DataFrame:
+        columns = ["chunk", "source", "kind", "messages", "total_latency", "mean_latency",
+                   "max_latency", "prompt_tokens", "completion_tokens"]
+        df = pd.DataFrame(self.records)
+        if df.empty:
+            return pd.DataFrame(columns=columns)
+        summary = df.groupby(["chunk", "source", "kind"], as_index=False).agg(
+            messages=("turn", "size"),
+            total_latency=("latency", "sum"),
+            mean_latency=("latency", "mean"),
+            max_latency=("latency", "max"),
+            prompt_tokens=("prompt_tokens", "sum"),
+            completion_tokens=("completion_tokens", "sum"),
+        )
+        return summary.sort_values("total_latency", ascending=False)[columns]
+
+    def kind_totals(self) -> pd.DataFrame:
+        """web_surfer 與 model 各自花費的總時間與 token。"""
+        df = pd.DataFrame(self.records)
+        if df.empty:
+            return df
+        return df.groupby("kind").agg(
+            total_latency=("latency", "sum"),
+            prompt_tokens=("prompt_tokens", "sum"),
+            completion_tokens=("completion_tokens", "sum"),
+        )
+
+    def to_summary_csv(self, path: str) -> None:
+        self.summary().merge(pd.DataFrame(self.stops, columns=["chunk", "stop_reason", "turns", "end"])[["chunk", "stop_reason"]],
+                             on="chunk", how="left").to_csv(path, index=False, encoding="utf-8-sig")